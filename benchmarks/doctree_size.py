@@ -0,0 +1,133 @@
+"""Measure the effect of ``slim_doctree`` on the pickles Sphinx writes.
+
+Builds a generated markdown project, or the one given on the command line,
+with and without ``slim_doctree`` and reports the size of the environment
+pickle and the doctrees and the time it takes to load them back.
+
+Usage: python benchmarks/doctree_size.py [sourcedir] [--pages N]
+"""
+
+import argparse
+import io
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+
+from sphinx.application import Sphinx
+
+CONF = """
+from sphinx_markdown_parser.parser import CommonMarkParser
+
+extensions = ['sphinx_markdown_parser']
+master_doc = 'index'
+exclude_patterns = ['_build']
+
+def setup(app):
+    app.add_source_suffix('.md', 'markdown')
+    app.add_source_parser(CommonMarkParser)
+    app.add_config_value('markdown_parser_config', {}, True)
+"""
+
+PAGE = """
+Section {0}
+===========
+
+Paragraph {0} with *emphasis*, `inline code {0}` and a <b>raw</b> tag.
+It goes on for a while so that the text dominates the doctree, the way
+prose does in real documentation.
+
+* item `one`
+* item `two`
+
+<div class="note">raw block {0}</div>
+
+```python
+print({0})
+```
+"""
+
+def generate(srcdir, pages):
+    with io.open(os.path.join(srcdir, 'conf.py'), 'w') as f:
+        f.write(CONF)
+    names = ['page%d' % i for i in range(pages)]
+    with io.open(os.path.join(srcdir, 'index.md'), 'w') as f:
+        f.write(u'Index\n=====\n\n')
+        f.write(u''.join('* [%s](%s.md)\n' % (n, n) for n in names))
+    for name in names:
+        with io.open(os.path.join(srcdir, name + '.md'), 'w') as f:
+            f.write(u''.join(PAGE.format(i) for i in range(20)))
+
+def build(srcdir, outdir, slim):
+    doctreedir = os.path.join(outdir, '.doctrees')
+    app = Sphinx(
+        srcdir=srcdir,
+        confdir=srcdir,
+        outdir=outdir,
+        doctreedir=doctreedir,
+        buildername='html',
+        status=None,
+        warning=None,
+        confoverrides={'markdown_parser_config': {'slim_doctree': slim}},
+        freshenv=True,
+    )
+    app.build()
+    return doctreedir
+
+def measure(doctreedir, repeat=5):
+    paths = [
+        os.path.join(root, name)
+        for root, _, names in os.walk(doctreedir)
+        for name in names
+        if name.endswith('.doctree')
+    ]
+    env_path = os.path.join(doctreedir, 'environment.pickle')
+    env_size = os.path.getsize(env_path)
+    doctree_size = sum(os.path.getsize(path) for path in paths)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in [env_path] + paths:
+            with open(path, 'rb') as f:
+                pickle.load(f)
+        timings.append(time.perf_counter() - start)
+    return env_size, doctree_size, min(timings)
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('sourcedir', nargs='?')
+    argparser.add_argument('--pages', type=int, default=100)
+    args = argparser.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        srcdir = args.sourcedir
+        if srcdir is None:
+            srcdir = os.path.join(tmpdir, 'src')
+            os.mkdir(srcdir)
+            generate(srcdir, args.pages)
+        results = {}
+        for slim in (False, True):
+            outdir = os.path.join(tmpdir, 'slim' if slim else 'full')
+            results[slim] = measure(build(srcdir, outdir, slim))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    print('%-12s %14s %14s %10s' % ('', 'environment', 'doctrees', 'load'))
+    for slim in (False, True):
+        env_size, doctree_size, load = results[slim]
+        print('%-12s %13dB %13dB %9.3fs' % (
+            'slim' if slim else 'full', env_size, doctree_size, load
+        ))
+    full, slim = results[False], results[True]
+    print('%-12s %13.1f%% %13.1f%% %9.1f%%' % (
+        'saved',
+        100.0 * (full[0] - slim[0]) / full[0],
+        100.0 * (full[1] - slim[1]) / full[1],
+        100.0 * (full[2] - slim[2]) / full[2],
+    ))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Measure the import time of the package entry points.
+
+Runs ``python -X importtime -c "import <module>"`` a few times for each
+entry point and keeps the fastest run. The time of an entry point is the
+cumulative time of the modules it imports beyond those imported at
+startup. The script exits with status 1 when an entry point takes longer
+than its budget, times ``--scale``, or imports sphinx although it is not
+needed.
+
+Usage: python benchmarks/import_time.py [--repeat N] [--scale X]
+"""
+
+import argparse
+import subprocess
+import sys
+
+# entry point, budget in milliseconds, whether it may import sphinx
+TARGETS = [
+    ('sphinx_markdown_parser', 5, False),
+    ('sphinx_markdown_parser.parser', 5, False),
+    ('sphinx_markdown_parser.client', 40, False),
+    ('sphinx_markdown_parser.commonmark_parser', 120, False),
+    ('sphinx_markdown_parser.markdown_parser', 200, False),
+    ('sphinx_markdown_parser.render', 250, False),
+    ('sphinx_markdown_parser.scripts', 250, False),
+    ('sphinx_markdown_parser.transform', 600, True),
+]
+
+def import_times(code):
+    """Return the cumulative microseconds of each top level import."""
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True
+    ).stderr
+    times = {}
+    for line in output.splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        # nested imports are indented after the separating space
+        name = fields[2].rstrip()[1:]
+        if not name.startswith(' '):
+            times[name] = int(fields[1])
+    return times
+
+def imported_modules(module):
+    code = 'import sys, %s; print(" ".join(sys.modules))' % module
+    return set(subprocess.check_output(
+        [sys.executable, '-c', code], universal_newlines=True
+    ).split())
+
+def measure(module, startup, repeat):
+    """Return the milliseconds taken to import ``module``."""
+    best = None
+    for _ in range(repeat):
+        times = import_times('import %s' % module)
+        total = sum(
+            time for name, time in times.items() if name not in startup
+        ) / 1000
+        best = total if best is None else min(best, total)
+    return best
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--repeat', type=int, default=5)
+    argparser.add_argument('--scale', type=float, default=1.0,
+                           help='multiply the budgets, on slow machines')
+    args = argparser.parse_args(argv)
+
+    startup = set(import_times('pass'))
+    failures = 0
+    print('%-42s %9s %9s  %s' % ('', 'ms', 'budget', 'sphinx'))
+    for module, budget, sphinx_allowed in TARGETS:
+        elapsed = measure(module, startup, args.repeat)
+        budget *= args.scale
+        sphinx = 'sphinx' in imported_modules(module)
+        failed = elapsed > budget or (sphinx and not sphinx_allowed)
+        failures += failed
+        print('%-42s %9.1f %9.1f  %-6s %s' % (
+            module, elapsed, budget, 'yes' if sphinx else 'no',
+            'FAIL' if failed else ''
+        ))
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Measure the requests per second of rendering markdown snippets.
+
+Renders the same snippets with ``docutils.core.publish_parts``, which sets
+up docutils on every call, and with `sphinx_markdown_parser.render`, which
+reuses cached settings and pooled converters.
+
+Usage: python benchmarks/render_throughput.py [--requests N]
+"""
+
+import argparse
+import sys
+import time
+
+from docutils.core import publish_parts
+
+from sphinx_markdown_parser.parser import MarkdownParser
+from sphinx_markdown_parser.render import render_html_body
+
+SNIPPETS = [
+    'Some *text* with `code` and a [link](http://example.com).',
+    '# Title\n\n* one\n* two\n* three\n',
+    '| a | b |\n|---|---|\n| 1 | 2 |\n',
+    '```python\nprint("hello")\n```\n\nAfter the **code**.',
+]
+
+OVERRIDES = {'doctitle_xform': False, 'output_encoding': 'unicode'}
+
+def publish(text):
+    return publish_parts(
+        text, parser=MarkdownParser(), writer_name='html',
+        settings_overrides=OVERRIDES
+    )['body']
+
+def render(text):
+    return render_html_body(text)
+
+def measure(function, requests):
+    start = time.perf_counter()
+    for index in range(requests):
+        function(SNIPPETS[index % len(SNIPPETS)])
+    return requests / (time.perf_counter() - start)
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--requests', type=int, default=2000)
+    args = argparser.parse_args(argv)
+
+    for text in SNIPPETS:
+        assert publish(text) == render(text), text
+    results = [
+        (name, measure(function, args.requests))
+        for name, function in (('publish_parts', publish),
+                               ('render', render))
+    ]
+    print('%-14s %12s' % ('', 'requests/s'))
+    for name, rate in results:
+        print('%-14s %12.0f' % (name, rate))
+    print('%-14s %11.1fx' % ('speedup', results[1][1] / results[0][1]))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Compare rendering a batch of documents on threads and on processes.
+
+Renders the same documents with `sphinx_markdown_parser.render.render_many`
+serially, on a thread pool and on a process pool, whose parts are pickled
+back to the parent. Threads only beat the serial run on free-threaded
+Python builds, where the GIL is disabled.
+
+Usage: python benchmarks/thread_vs_process.py [--documents N] [--workers N]
+"""
+
+import argparse
+import os
+import sys
+import sysconfig
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from sphinx_markdown_parser.render import render_many, render_parts
+
+SECTION = '''## Section {0}
+
+Some *text* with `code`, a [link](http://example.com/{0}) and **bold**
+words, long enough to wrap over a few lines of the paragraph.
+
+* one
+* two
+* three
+
+| a | b |
+|---|---|
+| {0} | {0} |
+
+```python
+print({0})
+```
+'''
+
+def make_document(index, sections=20):
+    return '# Document %d\n\n' % index + '\n'.join(
+        SECTION.format(section) for section in range(sections)
+    )
+
+def measure(function, texts):
+    start = time.perf_counter()
+    function(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+def gil_enabled():
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled() if is_gil_enabled else True
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--documents', type=int, default=200)
+    argparser.add_argument('--workers', type=int,
+                           default=min(8, os.cpu_count() or 1))
+    args = argparser.parse_args(argv)
+
+    texts = [make_document(index) for index in range(args.documents)]
+    expected = [render_parts(text) for text in texts]
+
+    def serial(texts):
+        return [render_parts(text) for text in texts]
+
+    def threads(texts):
+        with ThreadPoolExecutor(args.workers) as executor:
+            return render_many(texts, executor=executor)
+
+    def processes(texts):
+        with ProcessPoolExecutor(args.workers) as executor:
+            return render_many(texts, executor=executor)
+
+    results = []
+    for name, function in (('serial', serial), ('threads', threads),
+                           ('processes', processes)):
+        assert function(texts[:args.workers]) == expected[:args.workers]
+        results.append((name, measure(function, texts)))
+
+    print('python %s, GIL %s, %d workers' % (
+        sysconfig.get_python_version(),
+        'enabled' if gil_enabled() else 'disabled', args.workers
+    ))
+    print('%-10s %12s %8s' % ('', 'documents/s', 'speedup'))
+    for name, rate in results:
+        print('%-10s %12.1f %7.2fx' % (name, rate, rate / results[0][1]))
+
+if __name__ == '__main__':
+    sys.exit(main())
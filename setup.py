@@ -35,19 +35,23 @@ setup(
         'Topic :: Utilities',
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
     ],
     keywords='sphinx docs documentation markdown',
     packages=['sphinx_markdown_parser'],
+    # the package loads its submodules with module __getattr__ (PEP 562)
+    python_requires='>=3.7',
     install_requires=install_requires,
     include_package_data=True,
     entry_points={
         'console_scripts': [
+            'md2cache = sphinx_markdown_parser.scripts:md2cache',
+            'md2client = sphinx_markdown_parser.client:main',
+            'md2daemon = sphinx_markdown_parser.daemon:main',
             'md2html = sphinx_markdown_parser.scripts:md2html',
             'md2latex = sphinx_markdown_parser.scripts:md2latex',
             'md2man = sphinx_markdown_parser.scripts:md2man',
+            'md2multi = sphinx_markdown_parser.scripts:md2multi',
             'md2pseudoxml = sphinx_markdown_parser.scripts:md2pseudoxml',
             'md2xetex = sphinx_markdown_parser.scripts:md2xetex',
             'md2xml = sphinx_markdown_parser.scripts:md2xml',
@@ -1,7 +1,71 @@
 """docutils markdown parser"""
 
+import importlib
+
 __version__ = '0.2.4'
 
+def __getattr__(name):
+    """Import the submodule ``name`` on first access.
+
+    Nothing is imported with the package, so that the command line tools
+    and the parsers only load what they use.
+    """
+    if not name.startswith('_'):
+        try:
+            return importlib.import_module('.' + name, __name__)
+        except ModuleNotFoundError as error:
+            if error.name != '%s.%s' % (__name__, name):
+                raise
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
 def setup(app):
     """Initialize Sphinx extension."""
-    return {'version': __version__, 'parallel_read_safe': True}
+    from .config import compile_build_config
+    from .outdated import (
+        discard_unchanged, hash_sources, purge_hashes, record_hashes
+    )
+    from .shared_cache import start_shared_cache, stop_shared_cache
+    from .slim import slim_markdown_doctree
+    from .split import (
+        add_parts_toctree, read_preamble, rewrite_split_links, split_sources
+    )
+    from .source_index import refresh_source_index
+    from .timing import (
+        collect_timings, init_timings, merge_timings, purge_timings,
+        write_timing_report
+    )
+    from .trace import (
+        collect_spans, init_trace, merge_spans, purge_spans, write_trace
+    )
+    for stage in ('parse', 'transform'):
+        app.add_event('markdown-%s-start' % stage)
+        app.add_event('markdown-%s-end' % stage)
+    app.connect('builder-inited', compile_build_config)
+    app.connect('builder-inited', init_timings)
+    app.connect('builder-inited', init_trace)
+    app.connect('builder-inited', split_sources)
+    app.connect('builder-inited', start_shared_cache)
+    app.connect('source-read', read_preamble)
+    app.connect('env-get-outdated', discard_unchanged)
+    app.connect('env-before-read-docs', refresh_source_index)
+    app.connect('env-before-read-docs', hash_sources)
+    app.connect('env-purge-doc', purge_timings)
+    app.connect('env-purge-doc', purge_hashes)
+    app.connect('env-purge-doc', purge_spans)
+    app.connect('env-merge-info', merge_timings)
+    app.connect('env-merge-info', merge_spans)
+    app.connect('doctree-read', rewrite_split_links)
+    app.connect('doctree-read', slim_markdown_doctree)
+    # ahead of the environment collectors, which register toctrees
+    app.connect('doctree-read', add_parts_toctree, priority=400)
+    app.connect('env-updated', record_hashes)
+    app.connect('env-updated', collect_timings)
+    app.connect('env-updated', collect_spans)
+    app.connect('build-finished', write_timing_report)
+    app.connect('build-finished', write_trace)
+    app.connect('build-finished', stop_shared_cache)
+    return {
+        'version': __version__,
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
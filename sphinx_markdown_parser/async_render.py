@@ -0,0 +1,149 @@
+"""Render markdown from asyncio code without blocking the event loop.
+
+`AsyncRenderer` runs the functions of `render` in an executor, a thread
+pool by default or any ``concurrent.futures`` executor such as a process
+pool, with at most ``max_concurrency`` renders at a time. Requests for
+the same rendering that arrive while it is in flight share its result.
+"""
+
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .render import BODY_OVERRIDES, render_parts
+
+__all__ = ['AsyncRenderer']
+
+# default for max_concurrency
+MAX_CONCURRENCY = 4
+
+class InFlight:
+    """A render in progress and the number of requests waiting for it."""
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+        self.cancelled = False
+
+class AsyncRenderer:
+    """Render markdown in an executor, with bounded concurrency.
+
+    Parameters
+    ----------
+    executor : concurrent.futures.Executor
+        Executor running the renders. By default a thread pool of
+        ``max_concurrency`` threads, shut down by `close`.
+    max_concurrency : int
+        Number of renders submitted to the executor at a time.
+    timeout : float
+        Default number of seconds a request waits for its result, None
+        to wait as long as it takes.
+    """
+    def __init__(self, executor=None, max_concurrency=MAX_CONCURRENCY,
+                 timeout=None):
+        self.own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_concurrency)
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.semaphore = None
+        self.in_flight = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut down the executor if it was created by the renderer."""
+        if self.own_executor:
+            self.executor.shutdown(wait=False)
+
+    async def render_parts(self, text, writer_name='html',
+                           settings_overrides=None, parser_class=None,
+                           source_path=None, timeout=False):
+        """Render the markdown ``text`` and return the parts of the output.
+
+        The arguments are those of `render.render_parts`; ``timeout``
+        overrides the default timeout of the renderer.
+
+        A request that times out or is cancelled only cancels the render
+        when no other request waits for it. A render that already started
+        in the executor cannot be stopped: it runs to the end and holds
+        its slot of ``max_concurrency`` until then.
+
+        Raises
+        ------
+        asyncio.TimeoutError
+            If the result did not arrive in time.
+        """
+        args = (text, writer_name, settings_overrides, parser_class,
+                source_path)
+        key = self.request_key(*args)
+        entry = self.in_flight.get(key)
+        if entry is None or entry.cancelled:
+            entry = InFlight(asyncio.ensure_future(self.run(args)))
+            self.in_flight[key] = entry
+            entry.task.add_done_callback(
+                lambda task: self.forget(key, entry)
+            )
+        entry.waiters += 1
+        try:
+            parts = await asyncio.wait_for(
+                asyncio.shield(entry.task),
+                self.timeout if timeout is False else timeout
+            )
+        finally:
+            entry.waiters -= 1
+            if not entry.waiters and not entry.task.done():
+                entry.cancelled = True
+                entry.task.cancel()
+        # the waiters of a render each get their own dict
+        return dict(parts)
+
+    async def render_html_body(self, text, settings_overrides=None,
+                               parser_class=None, source_path=None,
+                               timeout=False):
+        """Render the markdown ``text`` to HTML, see
+        `render.render_html_body`."""
+        overrides = dict(BODY_OVERRIDES, **(settings_overrides or {}))
+        parts = await self.render_parts(
+            text, 'html', overrides, parser_class, source_path, timeout
+        )
+        return parts['body']
+
+    @staticmethod
+    def request_key(text, writer_name, settings_overrides, parser_class,
+                    source_path):
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        return digest, repr((
+            writer_name, sorted((settings_overrides or {}).items()),
+            parser_class, source_path
+        ))
+
+    def forget(self, key, entry):
+        if self.in_flight.get(key) is entry:
+            del self.in_flight[key]
+
+    async def run(self, args):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        await self.semaphore.acquire()
+        loop = asyncio.get_event_loop()
+        try:
+            future = self.executor.submit(render_parts, *args)
+        except BaseException:
+            self.semaphore.release()
+            raise
+        # the slot is only given back once the job is done in the
+        # executor, which cancelling the task does not stop
+        future.add_done_callback(lambda _: self.release(loop))
+        return await asyncio.wrap_future(future)
+
+    def release(self, loop):
+        try:
+            loop.call_soon_threadsafe(self.semaphore.release)
+        except RuntimeError:
+            # the event loop is closed
+            pass
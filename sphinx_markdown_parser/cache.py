@@ -0,0 +1,89 @@
+"""Caches shared by the parsers and transforms."""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from docutils import nodes
+
+class LRUCache:
+    """A mapping that keeps at most ``maxsize`` recently used entries.
+
+    A ``maxsize`` of 0 disables the cache, ``None`` makes it unbounded.
+    Lookups and updates are locked, so threads can share the cache.
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Return the value for ``key`` and mark it as recently used."""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store ``value`` for ``key``, evicting the oldest entries."""
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+def content_hash(text):
+    """Return a stable hash of ``text`` used as a cache key."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def get_cache(env, name, maxsize=128):
+    """Return the per-build cache ``name`` of the Sphinx environment ``env``.
+
+    Caches live on the application object, which is not pickled with the
+    environment, so they last for one build in each process.
+    """
+    caches = vars(env.app).setdefault('_markdown_caches', {})
+    cache = caches.get(name)
+    if cache is None:
+        cache = caches.setdefault(name, LRUCache(maxsize))
+    cache.maxsize = maxsize
+    return cache
+
+def copy_nodes(node_list, document=None, source=None):
+    """Deep copy docutils nodes so they can be cached or reused.
+
+    List and dict attributes are copied too, as transforms mutate them in
+    place.
+    The copies are attached to ``document`` and, when given, ``source``
+    replaces the source path they were parsed from.
+    """
+    copies = [node.deepcopy() for node in node_list]
+    for copy in copies:
+        for child in copy.traverse(nodes.Element):
+            for name, value in child.attributes.items():
+                if isinstance(value, (list, dict)):
+                    child.attributes[name] = type(value)(value)
+            child.document = document
+            if source is not None and child.source is not None:
+                child.source = source
+    return copies
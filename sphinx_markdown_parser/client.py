@@ -0,0 +1,220 @@
+"""Thin client of the conversion daemon.
+
+Converting a small file with the ``md2*`` commands mostly costs the
+imports of docutils, markdown and the parsers. This client only imports
+the standard library; it sends the source to a daemon (see `daemon`) over
+a Unix socket and starts the daemon if none is running. Messages are JSON
+objects prefixed with their length as a 4 byte big-endian integer.
+
+The socket is only used when it belongs to the user and no one else can
+access it, in ``$XDG_RUNTIME_DIR`` or in a private directory of the
+temporary directory.
+"""
+
+import argparse
+import io
+import json
+import os
+import socket
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+HEADER = struct.Struct('>I')
+
+# seconds of inactivity after which the daemon exits
+DEFAULT_IDLE_TIMEOUT = 600
+
+# seconds a started daemon is given to listen
+START_TIMEOUT = 10
+
+class DaemonError(Exception):
+    """The daemon could not be reached or failed to convert."""
+
+def check_private(path, st_mode_type):
+    """Raise `DaemonError` unless ``path`` is of the type ``st_mode_type``
+    and belongs to the user only.
+
+    Raises OSError if ``path`` does not exist.
+    """
+    st = os.lstat(path)
+    if (stat.S_IFMT(st.st_mode) != st_mode_type or
+            st.st_uid != os.getuid() or st.st_mode & 0o077):
+        raise DaemonError(
+            '%s does not belong to the user only, refusing to use it' % path
+        )
+
+def private_directory(path):
+    """Create the directory ``path``, accessible by the user only, unless
+    it exists, and check that no one else can access it."""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    check_private(path, stat.S_IFDIR)
+    return path
+
+def default_socket_path():
+    """Return the socket of the daemon of the user.
+
+    Unless ``$XDG_RUNTIME_DIR`` is set, the socket is put in a directory of
+    the temporary directory that is created for the user only.
+    """
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        directory = private_directory(os.path.join(
+            tempfile.gettempdir(), 'sphinx-markdown-parser-%d' % os.getuid()
+        ))
+    return os.path.join(directory, 'sphinx-markdown-parser.sock')
+
+def send_message(sock, message):
+    data = json.dumps(message).encode('utf-8')
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+def recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 16))
+        if not chunk:
+            raise EOFError('connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+def recv_message(sock):
+    size, = HEADER.unpack(recv_exactly(sock, HEADER.size))
+    return json.loads(recv_exactly(sock, size).decode('utf-8'))
+
+def request(path, message):
+    """Send ``message`` to the daemon listening on ``path``, return the
+    reply.
+
+    Raises `DaemonError` if the socket is not the user's own, so that
+    sources are never sent to the daemon of another user.
+    """
+    check_private(path, stat.S_IFSOCK)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        send_message(sock, message)
+        return recv_message(sock)
+
+def start_daemon(path, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Start a daemon on ``path`` in the background and wait for it."""
+    subprocess.Popen(
+        [sys.executable, '-m', 'sphinx_markdown_parser.daemon',
+         '--socket', path, '--idle-timeout', str(idle_timeout)],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL, start_new_session=True
+    )
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            return request(path, {'op': 'ping'})
+        except OSError:
+            time.sleep(0.05)
+    raise DaemonError('the daemon did not start on %s' % path)
+
+def convert(text, writer='html', settings=None, source_path=None,
+            path=None, start=True, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Convert markdown ``text`` with the daemon and return the output.
+
+    The daemon is started when none listens on ``path`` and ``start`` is
+    true. It reads the docutils configuration files of the current
+    directory, like the ``md2*`` commands.
+
+    Raises
+    ------
+    DaemonError
+        If the daemon cannot be reached or the conversion failed.
+    """
+    path = path or default_socket_path()
+    message = {
+        'op': 'convert',
+        'text': text,
+        'writer': writer,
+        'settings': settings or {},
+        'source_path': source_path,
+        'cwd': os.getcwd(),
+    }
+    try:
+        reply = request(path, message)
+    except OSError:
+        if not start:
+            raise DaemonError('no daemon listens on %s' % path)
+        start_daemon(path, idle_timeout)
+        reply = request(path, message)
+    if not reply.get('ok'):
+        raise DaemonError(reply.get('error'))
+    return reply['output'], reply.get('messages', '')
+
+def parse_setting(value):
+    name, sep, value = value.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError('expected <name>=<value>')
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return name.replace('-', '_'), value
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Convert a markdown file with the conversion daemon, '
+        'starting it if needed.'
+    )
+    parser.add_argument('source', nargs='?', default='-',
+                        help='markdown file, "-" (default) for stdin')
+    parser.add_argument('destination', nargs='?', default='-',
+                        help='output file, "-" (default) for stdout')
+    parser.add_argument('-w', '--writer', default='html',
+                        help='docutils writer (default: html)')
+    parser.add_argument('-s', '--setting', action='append', default=[],
+                        type=parse_setting, metavar='NAME=VALUE',
+                        help='docutils setting, the value is parsed as '
+                        'JSON if possible; may be repeated')
+    parser.add_argument('--socket',
+                        help='socket of the daemon (default: in '
+                        '$XDG_RUNTIME_DIR or in a private directory of the '
+                        'temporary directory)')
+    parser.add_argument('--idle-timeout', type=float,
+                        default=DEFAULT_IDLE_TIMEOUT,
+                        help='seconds of inactivity after which a daemon '
+                        'started by this command exits (default: '
+                        '%(default)s)')
+    parser.add_argument('--stop', action='store_true',
+                        help='stop the daemon and exit')
+    args = parser.parse_args(argv)
+    try:
+        path = args.socket or default_socket_path()
+        if args.stop:
+            try:
+                request(path, {'op': 'stop'})
+            except OSError:
+                pass
+            return 0
+        if args.source == '-':
+            text, source_path = sys.stdin.read(), None
+        else:
+            with io.open(args.source, encoding='utf-8') as f:
+                text = f.read()
+            source_path = os.path.abspath(args.source)
+        output, messages = convert(
+            text, args.writer, dict(args.setting), source_path, path,
+            idle_timeout=args.idle_timeout
+        )
+    except DaemonError as error:
+        sys.stderr.write('%s: %s\n' % (parser.prog, error))
+        return 1
+    sys.stderr.write(messages)
+    if args.destination == '-':
+        sys.stdout.write(output)
+    else:
+        with io.open(args.destination, 'w', encoding='utf-8') as f:
+            f.write(output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,25 @@
 """Docutils CommonMark parser"""
 
+import copy
 import sys
 from os.path import splitext
 
 from docutils import parsers, nodes
-from sphinx import addnodes
 
 from commonmark import Parser
 
 from warnings import warn
 
 if sys.version_info < (3, 0):
-    from urlparse import urlparse
+    from urlparse import urlparse, urlunparse
 else:
-    from urllib.parse import urlparse
+    from urllib.parse import urlparse, urlunparse
+
+from .config import get_config
+from .dependencies import note_link_dependency
+from .local import PerThread
+from .parse_cache import get_parse_cache
+from .timing import instrument
 
 __all__ = ['CommonMarkParser']
 
@@ -22,21 +28,54 @@ class CommonMarkParser(parsers.Parser):
 
     supported = ('md', 'markdown')
     translate_section_name = None
-    level = 0
+    slim_doctree = False
+
+    # the document last parsed, read by get_transforms in the same thread
+    document = PerThread()
 
     def __init__(self):
         self._level_to_elem = {}
 
+    def get_transforms(self):
+        transforms = parsers.Parser.get_transforms(self)
+        # the transforms import sphinx, and only apply under sphinx
+        if (self.document is not None
+                and get_config(self.document.settings) is not None):
+            from .transform import markdown_transforms
+            transforms.extend(markdown_transforms(self.document))
+        return transforms
+
     def parse(self, inputstring, document):
+        # per-document state lives on a throwaway copy, so one parser
+        # instance can be shared by documents, processes and threads
+        cache = get_parse_cache(document.settings)
+        if cache is None or not cache.restore(self, inputstring, document):
+            copy.copy(self).parse_document(inputstring, document)
+        self.document = document
+
+    def parse_document(self, inputstring, document):
         self.document = document
         self.current_node = document
+        config = get_config(document.settings)
+        self.slim_doctree = bool(config and config['slim_doctree'])
         self.setup_parse(inputstring, document)
         self.setup_sections()
-        parser = Parser()
-        ast = parser.parse(inputstring + '\n')
-        self.convert_ast(ast)
+        with instrument(document, 'parse', type(self).__name__,
+                        len(inputstring)) as timer:
+            with timer.phase('block parse'):
+                parser = Parser()
+                ast = parser.parse(inputstring + '\n')
+            with timer.phase('doctree walk'):
+                self.convert_ast(ast)
         self.finish_parse()
 
+    def text_source(self, text):
+        """Return the rawsource of a node holding ``text``.
+
+        With ``slim_doctree`` the text is not stored a second time.
+        """
+        return '' if self.slim_doctree else text
+
     def convert_ast(self, ast):
         for (node, entering) in ast.walker():
             fn_prefix = 'visit' if entering else 'depart'
@@ -103,7 +142,9 @@ class CommonMarkParser(parsers.Parser):
         self.current_node = section
 
     def visit_text(self, mdnode):
-        self.current_node.append(nodes.Text(mdnode.literal, mdnode.literal))
+        self.current_node.append(
+            nodes.Text(mdnode.literal, self.text_source(mdnode.literal))
+        )
 
     def visit_softbreak(self, _):
         self.current_node.append(nodes.Text('\n'))
@@ -125,20 +166,29 @@ class CommonMarkParser(parsers.Parser):
         self.current_node = n
 
     def visit_code(self, mdnode):
-        n = nodes.literal(mdnode.literal, mdnode.literal)
+        n = nodes.literal(self.text_source(mdnode.literal), mdnode.literal)
         self.current_node.append(n)
 
     def visit_link(self, mdnode):
         ref_node = nodes.reference()
         # Check destination is supported for cross-linking and remove extension
         destination = mdnode.destination
-        _, ext = splitext(destination)
+        parts = urlparse(destination)
+        _, ext = splitext(parts.path)
         # TODO check for other supported extensions, such as those specified in
         # the Sphinx conf.py file but how to access this information?
         # TODO this should probably only remove the extension for local paths,
         # i.e. not uri's starting with http or other external prefix.
         if ext.replace('.', '') in self.supported:
-            destination = destination.replace(ext, '')
+            note_link_dependency(self.document, destination)
+            if parts.fragment:
+                # links into a section of a document cannot be resolved as
+                # a document, link the html page like MarkdownParser does
+                destination = urlunparse(
+                    parts._replace(path=parts.path[:-len(ext)] + '.html')
+                )
+            else:
+                destination = destination.replace(ext, '')
         ref_node['refuri'] = destination
         # TODO okay, so this is acutally not always the right line number, but
         # these mdnodes won't have sourcepos on them for whatever reason. This
@@ -150,6 +200,8 @@ class CommonMarkParser(parsers.Parser):
 
         url_check = urlparse(destination)
         if not url_check.scheme and not url_check.fragment:
+            # sphinx is only imported for documents with relative links
+            from sphinx import addnodes
             wrap_node = addnodes.pending_xref(
                 reftarget=destination,
                 reftype='any',
@@ -168,7 +220,7 @@ class CommonMarkParser(parsers.Parser):
         self.current_node = ref_node
 
     def depart_link(self, mdnode):
-        if isinstance(self.current_node.parent, addnodes.pending_xref):
+        if self.current_node.parent.tagname == 'pending_xref':
             self.current_node = self.current_node.parent.parent
         else:
             self.current_node = self.current_node.parent
@@ -218,7 +270,9 @@ class CommonMarkParser(parsers.Parser):
         self.current_node = q
 
     def visit_html(self, mdnode):
-        raw_node = nodes.raw(mdnode.literal, mdnode.literal, format='html')
+        raw_node = nodes.raw(
+            self.text_source(mdnode.literal), mdnode.literal, format='html'
+        )
         if mdnode.sourcepos is not None:
             raw_node.line = mdnode.sourcepos[0][0]
         self.current_node.append(raw_node)
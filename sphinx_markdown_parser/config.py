@@ -0,0 +1,129 @@
+"""Compile the markdown_parser_config of a project."""
+
+import os
+from types import MappingProxyType
+
+DEFAULT_CONFIG = {
+    'auto_toc_tree_maxdepth': 1,
+    'auto_toc_tree_numbered': None,
+    'auto_toc_tree_section': None,
+    'collect_timings': False,
+    'commonmark_suffixes': ['.md'],
+    'content_hash_outdated': True,
+    'enable_auto_doc_ref': False,
+    'enable_auto_structify': False,
+    'enable_auto_toc_tree': True,
+    'enable_eval_rst': True,
+    'enable_inline_math': True,
+    'enable_math': True,
+    'eval_rst_cache_size': 256,
+    'extensions': [],
+    'node_cache_size': 1024,
+    'parse_cache_dir': None,
+    'parser': 'CommonMark',
+    'shared_cache': False,
+    'shared_cache_max_bytes': 64 * 1024 * 1024,
+    'slim_doctree': False,
+    'split_dir': '_split',
+    'split_heading_level': 2,
+    'split_threshold': None,
+    'trace_file': None,
+    'url_resolver': lambda x: x,
+}
+
+DEPRECATED_OPTIONS = {
+    'enable_auto_doc_ref': (
+        'AutoStructify option "enable_auto_doc_ref" is deprecated'
+    ),
+}
+
+def compile_config(*layers):
+    """Merge config dicts, validate them and return a read-only mapping.
+
+    Later layers override earlier ones; ``None`` layers are skipped.
+
+    Raises
+    ------
+    ValueError
+        If an option has a value of the wrong type.
+    """
+    config = {}
+    for layer in layers:
+        if layer:
+            config.update(layer)
+    suffixes = config.get('commonmark_suffixes', ())
+    if isinstance(suffixes, str):
+        suffixes = (suffixes,)
+    config['commonmark_suffixes'] = tuple(suffixes)
+    config['extensions'] = tuple(config.get('extensions') or ())
+    if not callable(config.get('url_resolver', callable)):
+        raise ValueError('markdown_parser_config "url_resolver" must be '
+                         'callable')
+    for option in (
+        'eval_rst_cache_size', 'node_cache_size', 'split_threshold'
+    ):
+        cache_size = config.get(option, 0)
+        if cache_size is not None and (
+            not isinstance(cache_size, int) or cache_size < 0
+        ):
+            raise ValueError('markdown_parser_config "%s" must be a '
+                             'non-negative integer or None' % option)
+    max_bytes = config.get('shared_cache_max_bytes', 1)
+    if not isinstance(max_bytes, int) or max_bytes <= 0:
+        raise ValueError('markdown_parser_config "shared_cache_max_bytes" '
+                         'must be a positive integer')
+    if config.get('split_heading_level', 1) not in range(1, 7):
+        raise ValueError('markdown_parser_config "split_heading_level" must '
+                         'be between 1 and 6')
+    split_dir = os.path.normpath(config.get('split_dir') or '.')
+    if split_dir == '.' or split_dir.startswith('..') or (
+        os.path.isabs(split_dir)
+    ):
+        raise ValueError('markdown_parser_config "split_dir" must be a '
+                         'directory inside the source directory')
+    return MappingProxyType(config)
+
+def deprecation_warnings(config):
+    """Return the deprecation messages for the options used in ``config``."""
+    return [
+        message for option, message in sorted(DEPRECATED_OPTIONS.items())
+        if config.get(option)
+    ]
+
+def get_build_config(app):
+    """Return the config compiled for the current build of ``app``.
+
+    The config is compiled on the first call, normally from the
+    ``builder-inited`` event, and deprecation warnings are logged then,
+    once per build.
+    """
+    config = getattr(app, '_markdown_config', None)
+    if config is None:
+        from sphinx.errors import ConfigError
+        from sphinx.util import logging
+        logger = logging.getLogger(__name__)
+        try:
+            config = compile_config(
+                DEFAULT_CONFIG,
+                getattr(app.config, 'markdown_parser_config', None)
+            )
+        except ValueError as exc:
+            raise ConfigError(str(exc))
+        for message in deprecation_warnings(config):
+            logger.warning(message)
+        app._markdown_config = config
+    return config
+
+def get_config(settings):
+    """Return the build config for a document's settings.
+
+    Returns ``None`` when the document is not read by Sphinx.
+    """
+    env = getattr(settings, 'env', None)
+    if env is None or env.app is None:
+        return None
+    return get_build_config(env.app)
+
+def compile_build_config(app):
+    """Compile the config once the builder is initialized."""
+    get_build_config(app)
@@ -0,0 +1,420 @@
+"""Convert markdown files with docutils writers, many at a time.
+
+`Converter` keeps the parser, reader, writer and settings of a docutils
+publisher and reuses them for every file it converts. `main` backs the
+``md2*`` commands: with ``--output-dir`` they convert any number of files
+and directories with a pool of processes, each with its own `Converter`,
+with ``--watch`` they keep converting the files that change (see `watch`);
+without either they behave like ``publish_cmdline``.
+"""
+
+import copy
+import multiprocessing
+import os
+import sys
+
+import docutils
+from docutils import frontend, io, readers, writers
+from docutils.core import Publisher, publish_cmdline
+from docutils.transforms import Transformer
+from docutils.utils import DependencyList
+
+from .parser import MarkdownParser
+
+# file extensions of the files written by the writers
+EXTENSIONS = {
+    'html': '.html',
+    'latex': '.tex',
+    'manpage': '.1',
+    'pseudoxml': '.txt',
+    'xml': '.xml',
+}
+
+USAGE = (
+    '%prog [options] [<source> [<destination>]]\n'
+    '       %prog [options] --output-dir <directory> <source>...\n'
+    '       %prog [options] --watch <source> <destination>'
+)
+
+def copy_settings(settings):
+    """Return a copy of ``settings`` for one conversion.
+
+    ``Values.copy`` is shallow, so list values are copied as well, and a
+    dependency list that records to no file is replaced by an empty one;
+    the conversion then leaves ``settings`` unchanged.
+    """
+    settings = settings.copy()
+    for name, value in vars(settings).items():
+        if isinstance(value, list):
+            setattr(settings, name, list(value))
+    dependencies = getattr(settings, 'record_dependencies', None)
+    if isinstance(dependencies, DependencyList) and dependencies.file is None:
+        settings.record_dependencies = DependencyList()
+    return settings
+
+class Converter:
+    """Convert markdown sources to the format of the writer ``writer_name``.
+
+    The components of the publisher and its settings are created once;
+    ``settings_overrides`` override the default settings. Converters of
+    the same writer and overrides can share ``settings``, which are never
+    changed; each conversion works on a copy. ``parser_class`` defaults to
+    `MarkdownParser`.
+    """
+    def __init__(self, writer_name, settings_overrides=None, settings=None,
+                 parser_class=None):
+        self.writer_name = writer_name
+        self.parser = (parser_class or MarkdownParser)()
+        self.reader = readers.get_reader_class('standalone')(
+            parser=self.parser
+        )
+        self.writer = writers.get_writer_class(writer_name)()
+        if settings is None:
+            settings = self.option_parser(
+                defaults=settings_overrides
+            ).get_default_values()
+        self.settings = settings
+
+    def option_parser(self, option_parser_class=frontend.OptionParser,
+                      components=(), **kwargs):
+        """Return an option parser for the settings of the components."""
+        return option_parser_class(
+            components=(self.parser, self.reader, self.writer) +
+            tuple(components),
+            read_config_files=True,
+            **kwargs
+        )
+
+    def publisher(self, source_class=io.FileInput,
+                  destination_class=io.FileOutput):
+        settings = copy_settings(self.settings)
+        # errors are reported by the caller, not by exiting
+        settings.traceback = True
+        return Publisher(
+            self.reader, self.parser, self.writer, settings=settings,
+            source_class=source_class, destination_class=destination_class
+        )
+
+    def convert(self, source_path, destination_path=None):
+        """Convert the file ``source_path``.
+
+        The output is written to ``destination_path``, or to stdout when
+        it is None, and returned.
+        """
+        publisher = self.publisher()
+        publisher.set_source(source_path=source_path)
+        publisher.set_destination(destination_path=destination_path)
+        return publisher.publish()
+
+    def convert_string(self, text, source_path=None, warning_stream=None):
+        """Convert the markdown ``text`` and return the output.
+
+        System messages go to ``warning_stream`` if given.
+        """
+        publisher = self.publisher(io.StringInput, io.StringOutput)
+        if warning_stream is not None:
+            publisher.settings.warning_stream = warning_stream
+        publisher.set_source(text, source_path)
+        publisher.set_destination()
+        return publisher.publish()
+
+    def convert_parts(self, text, source_path=None, warning_stream=None):
+        """Convert the markdown ``text`` and return the parts of the output,
+        see ``docutils.core.publish_parts``."""
+        self.convert_string(text, source_path, warning_stream)
+        # the writer keeps updating the same dict
+        return dict(self.writer.parts)
+
+    def read(self, source_path):
+        """Read the file ``source_path`` and apply all transforms but those
+        of the writer.
+
+        Returns the document, ready for the `write` of any converter.
+        """
+        settings = self.settings.copy()
+        settings.traceback = True
+        settings._source = source_path
+        source = io.FileInput(
+            source_path=source_path, encoding=settings.input_encoding
+        )
+        document = self.reader.read(source, self.parser, settings)
+        document.transformer.populate_from_components(
+            (source, self.reader, self.parser)
+        )
+        document.transformer.apply_transforms()
+        return document
+
+    def write(self, document, destination_path=None):
+        """Apply the transforms of the writer to ``document`` and write it.
+
+        ``document`` is changed by the transforms and writer. The output is
+        written to ``destination_path``, or to stdout when it is None, and
+        returned.
+        """
+        settings = self.settings.copy()
+        settings.traceback = True
+        settings._source = document.settings._source
+        settings._destination = destination_path
+        document.settings = settings
+        document.transformer = Transformer(document)
+        destination = io.FileOutput(
+            destination_path=destination_path,
+            encoding=settings.output_encoding,
+            error_handler=settings.output_encoding_error_handler
+        )
+        document.transformer.populate_from_components(
+            (self.writer, destination)
+        )
+        document.transformer.apply_transforms()
+        output = self.writer.write(document, destination)
+        self.writer.assemble_parts()
+        return output
+
+def copy_document(document):
+    """Return a deep copy of ``document`` sharing its settings and
+    reporter."""
+    # the reporter and transformer are not part of the state of a document
+    document_copy = copy.deepcopy(
+        document, {id(document.settings): document.settings}
+    )
+    document_copy.reporter = document.reporter
+    return document_copy
+
+def convert_formats(source_path, targets, settings_overrides=None):
+    """Parse ``source_path`` once and write it with several writers.
+
+    ``targets`` are ``(writer name, destination path)`` pairs, a
+    destination of None is stdout. The document is copied for every
+    writer but the last, as the writer transforms change it. Returns the
+    outputs.
+    """
+    converters = [
+        Converter(writer_name, settings_overrides)
+        for writer_name, _ in targets
+    ]
+    document = converters[0].read(source_path)
+    outputs = []
+    for index, (converter, (_, destination)) in enumerate(
+        zip(converters, targets), 1
+    ):
+        outputs.append(converter.write(
+            document if index == len(targets) else copy_document(document),
+            destination
+        ))
+    return outputs
+
+class BatchSettings(docutils.SettingsSpec):
+    settings_spec = (
+        'Batch Conversion Options',
+        None,
+        (
+            ('Convert all sources, files or directories of markdown files, '
+             'into this directory. Directories are converted recursively '
+             'and their layout is kept, as is the layout of the files.',
+             ['--output-dir'], {'metavar': '<directory>'}),
+            ('Number of processes converting files in parallel. '
+             'Default: the number of CPUs.',
+             ['--jobs'], {'metavar': '<n>', 'type': 'int',
+                          'validator': frontend.validate_nonnegative_int}),
+            ('Keep running and convert the sources again whenever their '
+             'content changes.',
+             ['--watch'], {'action': 'store_true',
+                           'validator': frontend.validate_boolean}),
+            ('Seconds between two checks for changes in watch mode. '
+             'Default: 1.',
+             ['--watch-interval'], {'metavar': '<seconds>', 'type': 'float'}),
+        )
+    )
+
+class BatchOptionParser(frontend.OptionParser):
+    """Accept any number of sources, stored in ``_sources``."""
+    def check_values(self, values, args):
+        values._sources = args
+        values._source = values._destination = None
+        frontend.make_paths_absolute(
+            values.__dict__, self.relative_path_settings
+        )
+        values._config_files = self.config_files
+        return values
+
+def find_sources(paths, suffixes=('.md', '.markdown')):
+    """Yield the files of ``paths`` and their paths relative to the output
+    directory.
+
+    Directories are searched for files with one of ``suffixes``, whose
+    paths are relative to the directory. Files keep their paths relative
+    to the deepest directory holding all the files of ``paths``.
+    """
+    files = [path for path in paths if not os.path.isdir(path)]
+    if files:
+        base = os.path.commonpath(
+            [os.path.dirname(os.path.abspath(path)) for path in files]
+        )
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path, os.path.relpath(os.path.abspath(path), base)
+            continue
+        for root, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(suffixes):
+                    source = os.path.join(root, filename)
+                    yield source, os.path.relpath(source, path)
+
+def output_path(output_dir, relative_path, writer_name):
+    root, _ = os.path.splitext(relative_path)
+    return os.path.join(output_dir, root + EXTENSIONS.get(writer_name, ''))
+
+def convert_file(converter, source, destination):
+    """Convert ``source`` to ``destination`` and return the error, if any."""
+    try:
+        os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+        converter.convert(source, destination)
+    except (Exception, SystemExit) as error:
+        return '%s: %s' % (type(error).__name__, error)
+    return None
+
+# the converter of a worker process
+_converter = None
+
+def init_worker(converter):
+    global _converter
+    _converter = converter
+
+def convert_in_worker(job):
+    return convert_file(_converter, *job)
+
+def convert_batch(converter, jobs, processes=None, stream=None):
+    """Convert the ``(source, destination)`` pairs of ``jobs``.
+
+    Files are converted by ``processes`` worker processes, or in this
+    process where they cannot be forked. Progress and errors are reported
+    to ``stream``, if given, in the order of ``jobs``. An error only fails
+    its own file.
+
+    Returns the number of files that failed.
+    """
+    processes = processes or os.cpu_count() or 1
+    width = len(str(len(jobs)))
+    failures = 0
+    if (processes == 1 or len(jobs) < 2 or
+            'fork' not in multiprocessing.get_all_start_methods()):
+        results = (convert_file(converter, *job) for job in jobs)
+        pool = None
+    else:
+        pool = multiprocessing.get_context('fork').Pool(
+            min(processes, len(jobs)), init_worker, (converter, )
+        )
+        results = pool.imap(convert_in_worker, jobs)
+    try:
+        for index, ((source, destination), error) in enumerate(
+            zip(jobs, results), 1
+        ):
+            if error is None:
+                message = '%s -> %s' % (source, destination)
+            else:
+                failures += 1
+                message = '%s: %s' % (source, error)
+            if stream is not None:
+                stream.write('[%*d/%d] %s\n' % (
+                    width, index, len(jobs), message
+                ))
+                stream.flush()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return failures
+
+def main(writer_name, description, argv=None):
+    """Run an ``md2*`` command and return its exit status."""
+    if argv is None:
+        argv = sys.argv[1:]
+    converter = Converter(writer_name)
+    option_parser = converter.option_parser(
+        BatchOptionParser, (BatchSettings(), ),
+        usage=USAGE, description=description
+    )
+    settings = option_parser.parse_args(argv)
+    if settings.watch_interval is not None and not settings.watch:
+        option_parser.error('--watch-interval requires --watch')
+    if settings.output_dir is None and not settings.watch:
+        # publish_cmdline does not know the batch options
+        if settings.jobs is not None:
+            option_parser.error('--jobs requires --output-dir')
+        publish_cmdline(
+            writer_name=writer_name, parser=MarkdownParser(),
+            description=description, argv=argv
+        )
+        return 0
+    if settings.output_dir is None and len(settings._sources) != 2:
+        option_parser.error('--watch without --output-dir takes a source '
+                            'and a destination')
+    if not settings._sources:
+        option_parser.error('no sources given')
+    converter.settings = settings
+    stream = None if settings.report_level > 4 else sys.stderr
+
+    def discover():
+        if settings.output_dir is None:
+            return [tuple(settings._sources)]
+        return [
+            (source, output_path(settings.output_dir, path, writer_name))
+            for source, path in find_sources(settings._sources)
+        ]
+
+    if settings.watch:
+        from .watch import watch
+        try:
+            interval = settings.watch_interval
+            watch(converter, discover, 1.0 if interval is None else interval,
+                  settings.jobs, stream)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    failures = convert_batch(converter, discover(), settings.jobs, stream)
+    return 1 if failures else 0
+
+FORMATS_USAGE = '%prog [options] <source> <writer>:<destination>...'
+
+def formats_main(description, argv=None):
+    """Run the ``md2multi`` command and return its exit status.
+
+    Only the options of the parser and reader are accepted, as the
+    settings of the writers clash; they apply to every writer.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    option_parser = BatchOptionParser(
+        components=(MarkdownParser, readers.get_reader_class('standalone')),
+        read_config_files=True,
+        usage=FORMATS_USAGE,
+        description=description
+    )
+    # only the options given end up in the settings
+    settings = option_parser.parse_args(argv, frontend.Values())
+    if len(settings._sources) < 2:
+        option_parser.error('a source and at least one output are required')
+    source, outputs = settings._sources[0], settings._sources[1:]
+    targets = []
+    for output in outputs:
+        writer_name, sep, destination = output.partition(':')
+        if not sep or not destination:
+            option_parser.error('outputs are given as <writer>:<destination>')
+        try:
+            writers.get_writer_class(writer_name)
+        except ImportError:
+            option_parser.error('unknown writer "%s"' % writer_name)
+        targets.append(
+            (writer_name, None if destination == '-' else destination)
+        )
+    overrides = {
+        name: value for name, value in vars(settings).items()
+        if not name.startswith('_')
+    }
+    try:
+        convert_formats(source, targets, overrides)
+    except (Exception, SystemExit) as error:
+        sys.stderr.write('%s: %s\n' % (type(error).__name__, error))
+        return 1
+    return 0
@@ -0,0 +1,176 @@
+"""Daemon converting markdown for the thin client of `client`.
+
+The daemon listens on a Unix socket, readable by its user only, and
+answers one request per connection. It keeps a `Converter` per writer,
+settings and docutils configuration files warm, and exits when it got no
+request for ``idle_timeout`` seconds. Requests are handled one at a time,
+each in the working directory of its client.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import socketserver
+import sys
+
+from docutils import frontend
+
+from .cache import LRUCache
+from .client import (
+    DEFAULT_IDLE_TIMEOUT, DaemonError, default_socket_path, recv_message,
+    request, send_message
+)
+from .convert import Converter
+
+# number of converters, per writer and settings, kept warm
+CONVERTER_CACHE_SIZE = 16
+
+@contextlib.contextmanager
+def working_directory(path):
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+def config_files():
+    """Return the docutils configuration files read in the current
+    directory, with their modification times."""
+    paths = os.environ.get('DOCUTILSCONFIG')
+    paths = (paths.split(os.pathsep) if paths is not None else
+             frontend.OptionParser.standard_config_files)
+    files = []
+    for path in paths:
+        path = os.path.abspath(os.path.expanduser(path.strip()))
+        try:
+            files.append((path, os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
+    return tuple(files)
+
+class ConversionHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            message = recv_message(self.request)
+        except (EOFError, OSError, ValueError):
+            return
+        try:
+            reply = self.server.dispatch(message)
+        except Exception as error:
+            reply = {
+                'ok': False,
+                'error': '%s: %s' % (type(error).__name__, error),
+            }
+        try:
+            send_message(self.request, reply)
+        except OSError:
+            pass
+
+class ConversionServer(socketserver.UnixStreamServer):
+    """Serve conversion requests on the Unix socket ``path``."""
+    def __init__(self, path, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.path = path
+        self.timeout = idle_timeout
+        self.converters = LRUCache(CONVERTER_CACHE_SIZE)
+        self.running = True
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.__init__(
+                self, path, ConversionHandler
+            )
+        finally:
+            os.umask(umask)
+
+    def converter(self, writer, settings):
+        # the settings read from the configuration files of the client
+        # directory (e.g. ./docutils.conf) are part of the converter
+        key = (
+            writer, json.dumps(settings, sort_keys=True), os.getcwd(),
+            config_files()
+        )
+        converter = self.converters.get(key)
+        if converter is None:
+            converter = Converter(
+                writer, dict(settings, output_encoding='unicode')
+            )
+            self.converters.put(key, converter)
+        return converter
+
+    def dispatch(self, message):
+        """Return the reply to the request ``message``."""
+        op = message.get('op')
+        if op == 'ping':
+            return {'ok': True, 'pid': os.getpid()}
+        if op == 'stop':
+            self.running = False
+            return {'ok': True}
+        if op == 'convert':
+            messages = io.StringIO()
+            with working_directory(message.get('cwd') or os.getcwd()):
+                converter = self.converter(
+                    message.get('writer') or 'html',
+                    message.get('settings') or {}
+                )
+                output = converter.convert_string(
+                    message['text'], message.get('source_path'), messages
+                )
+            return {
+                'ok': True,
+                'output': output,
+                'messages': messages.getvalue(),
+            }
+        return {'ok': False, 'error': 'unknown operation %r' % (op, )}
+
+    def handle_timeout(self):
+        self.running = False
+
+    def serve(self):
+        """Handle requests until stopped or idle for ``timeout`` seconds."""
+        try:
+            while self.running:
+                self.handle_request()
+        finally:
+            self.server_close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+def is_running(path):
+    try:
+        return request(path, {'op': 'ping'}).get('ok', False)
+    except (EOFError, OSError, ValueError):
+        return False
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run the markdown conversion daemon.'
+    )
+    parser.add_argument('--socket',
+                        help='socket to listen on (default: in '
+                        '$XDG_RUNTIME_DIR or in a private directory of the '
+                        'temporary directory)')
+    parser.add_argument('--idle-timeout', type=float,
+                        default=DEFAULT_IDLE_TIMEOUT,
+                        help='seconds of inactivity after which the daemon '
+                        'exits (default: %(default)s)')
+    args = parser.parse_args(argv)
+    try:
+        path = args.socket or default_socket_path()
+        if os.path.lexists(path) and is_running(path):
+            sys.stderr.write('a daemon already listens on %s\n' % path)
+            return 1
+    except DaemonError as error:
+        sys.stderr.write('%s: %s\n' % (parser.prog, error))
+        return 1
+    if os.path.lexists(path):
+        # left behind by a daemon that did not exit cleanly
+        os.unlink(path)
+    ConversionServer(path, args.idle_timeout).serve()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""Record the source files a markdown document depends on."""
+
+import os
+import urllib.parse
+
+from .source_index import get_source_index
+
+def note_link_dependency(document, uri):
+    """Record that ``document`` links the local source file ``uri``.
+
+    Relative uris are resolved against the directory of the document and
+    absolute ones against the Sphinx source directory. Only files that
+    exist in the source tree are recorded, with ``env.note_dependency``,
+    so that Sphinx re-reads the document when the linked file changes.
+    ``uri`` is also appended to the ``markdown_links`` list of
+    ``document``, if it has one, whether or not it is recorded. Outside of
+    Sphinx nothing else is done.
+    """
+    links = getattr(document, 'markdown_links', None)
+    if links is not None:
+        links.append(uri)
+    env = getattr(document.settings, 'env', None)
+    if env is None or env.app is None or not env.docname:
+        return
+    parts = urllib.parse.urlsplit(uri)
+    if parts.scheme or parts.netloc or not parts.path:
+        return
+    path = urllib.parse.unquote(parts.path)
+    if path.startswith('/'):
+        path = os.path.join(env.srcdir, path.lstrip('/'))
+    else:
+        path = os.path.join(os.path.dirname(document['source']), path)
+    path = os.path.normpath(path)
+    if path != os.path.normpath(document['source']) and (
+        get_source_index(env).exists(path)
+    ):
+        env.note_dependency(path)
@@ -1,12 +1,12 @@
 class Depth:
-    depth = 0
-
-    sub_depth = {}
+    def __init__(self):
+        self.depth = 0
+        self.sub_depth = {}
 
     def get(self, name=None):
         if name:
             return self.sub_depth[name] if name in self.sub_depth else 0
-        return depth
+        return self.depth
 
     def descend(self, name=None):
         self.depth = self.depth + 1
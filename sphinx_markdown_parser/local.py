@@ -0,0 +1,34 @@
+"""Per-thread attributes for objects shared by threads."""
+
+import threading
+import weakref
+
+class PerThread:
+    """Descriptor of an attribute with a value for each thread.
+
+    Reading the attribute in a thread that did not set it returns
+    ``default``. Values are kept outside of the instance, so copying or
+    pickling it neither shares nor carries them.
+    """
+    def __init__(self, default=None):
+        self.default = default
+        self.values = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        local = self.values.get(instance)
+        return getattr(local, 'value', self.default)
+
+    def __set__(self, instance, value):
+        local = self.values.get(instance)
+        if local is None:
+            with self.lock:
+                local = self.values.setdefault(instance, threading.local())
+        local.value = value
+
+    def __delete__(self, instance):
+        local = self.values.get(instance)
+        if local is not None and hasattr(local, 'value'):
+            del local.value
@@ -1,5 +1,6 @@
 """Docutils Markdown parser"""
 
+import copy
 from collections import OrderedDict
 
 from docutils import parsers, nodes
@@ -9,9 +10,16 @@ from markdown import util
 import urllib.parse
 import posixpath
 
-from pydash import _
 import re
-import yaml
+import time
+
+from .cache import content_hash, get_cache
+from .config import DEFAULT_CONFIG, compile_config, get_config
+from .dependencies import note_link_dependency
+from .local import PerThread
+from .parse_cache import get_parse_cache
+from .shared_cache import shared_get, shared_put
+from .timing import PhaseTimer, instrument
 
 __all__ = ['MarkdownParser']
 
@@ -36,11 +44,16 @@ IGNORE_ALL_CHILDREN = object()
 
 class Markdown(markdown.Markdown):
 
-    def parse(self, source):
+    def parse(self, source, timer=None):
         """
         Like super.convert() but returns the parse tree instead of doing
         postprocessing.
+
+        When given, ``timer`` records the durations of the block parse and
+        treeprocessors phases.
         """
+        if timer is None:
+            timer = PhaseTimer()
 
         # Fixup the source text
         if not source.strip():
@@ -53,19 +66,21 @@ class Markdown(markdown.Markdown):
             e.reason += '. -- Note: Markdown only accepts unicode input!'
             raise
 
-        # Split into lines and run the line preprocessors.
-        self.lines = source.split("\n")
-        for prep in self.preprocessors:
-            self.lines = prep.run(self.lines)
+        with timer.phase('block parse'):
+            # Split into lines and run the line preprocessors.
+            self.lines = source.split("\n")
+            for prep in self.preprocessors:
+                self.lines = prep.run(self.lines)
 
-        # Parse the high-level elements.
-        root = self.parser.parseDocument(self.lines).getroot()
+            # Parse the high-level elements.
+            root = self.parser.parseDocument(self.lines).getroot()
 
-        # Run the tree-processors
-        for treeprocessor in self.treeprocessors:
-            newRoot = treeprocessor.run(root)
-            if newRoot is not None:
-                root = newRoot
+        with timer.phase('treeprocessors'):
+            # Run the tree-processors
+            for treeprocessor in self.treeprocessors:
+                newRoot = treeprocessor.run(root)
+                if newRoot is not None:
+                    root = newRoot
 
         return root
 
@@ -74,29 +89,83 @@ class MarkdownParser(parsers.Parser):
 
     supported = ('md', 'markdown')
     translate_section_name = None
+    slim_doctree = False
+
+    # the document last parsed, read by get_transforms in the same thread
+    document = PerThread()
 
-    default_config = {
-        'extensions': []
-    }
+    default_config = DEFAULT_CONFIG
 
-    def __init__(self, config={}):
+    def __init__(self, config=None):
         self._level_to_elem = {}
-        self.config = self.default_config.copy()
-        self.config.update(config)
+        self.config_overrides = config
+        self.config = compile_config(self.default_config, config)
+
+    def get_config(self, document):
+        """Return the config used to parse ``document``.
+
+        Under Sphinx the ``markdown_parser_config`` of the build is layered
+        over the config given to the constructor, once per build.
+        """
+        config = get_config(document.settings)
+        if config is None:
+            return self.config
+        if not self.config_overrides and (
+            self.default_config is DEFAULT_CONFIG
+        ):
+            return config
+        env = document.settings.env
+        key = (id(self.default_config),
+               repr(sorted((self.config_overrides or {}).items())))
+        cache = get_cache(env, 'parser_config', None)
+        merged = cache.get(key)
+        if merged is None:
+            merged = compile_config(
+                self.default_config, self.config_overrides,
+                getattr(env.app.config, 'markdown_parser_config', None)
+            )
+            cache.put(key, merged)
+        return merged
+
+    def get_transforms(self):
+        transforms = parsers.Parser.get_transforms(self)
+        # the transforms import sphinx, and only apply under sphinx
+        if (self.document is not None
+                and get_config(self.document.settings) is not None):
+            from .transform import markdown_transforms
+            transforms.extend(markdown_transforms(self.document))
+        return transforms
 
     def parse(self, inputstring, document):
+        # per-document state lives on a throwaway copy, so one parser
+        # instance can be shared by documents, processes and threads
+        cache = get_parse_cache(document.settings)
+        if cache is None or not cache.restore(self, inputstring, document):
+            copy.copy(self).parse_document(inputstring, document)
+        self.document = document
+
+    def parse_document(self, inputstring, document):
         self.document = document
         self.current_node = document
-        try:
-            new_cfg = self.document.settings.env.config.markdown_parser_config
-            self.config.update(new_cfg)
-        except AttributeError:
-            pass
+        config = self.get_config(document)
+        self.slim_doctree = config['slim_doctree']
         self.setup_parse(inputstring, document)
-        frontmatter = self.get_frontmatter(inputstring)
+        with instrument(document, 'parse', type(self).__name__,
+                        len(inputstring)) as timer:
+            with timer.phase('frontmatter'):
+                frontmatter = self.get_frontmatter(inputstring)
+                source = self.get_md(inputstring) + "\n"
+
+            with timer.phase('block parse'):
+                self.md = Markdown(extensions=config['extensions'])
+            tree = self.md.parse(source, timer)
+
+            with timer.phase('doctree walk'):
+                self.walk_document(tree)
+
+        self.finish_parse()
 
-        self.md = Markdown(extensions=self.config.get('extensions'))
-        tree = self.md.parse(self.get_md(inputstring) + "\n")
+    def walk_document(self, tree):
         self.prep_raw_html()
 
         # the stack for depth-traverse-reading the markdown AST
@@ -114,7 +183,12 @@ class MarkdownParser(parsers.Parser):
         #print(text[:min(len(text), text.find("<title>") + 200)])
         #print("end result")
 
-        self.finish_parse()
+    def text_source(self, text):
+        """Return the rawsource of a node holding ``text``.
+
+        With ``slim_doctree`` the text is not stored a second time.
+        """
+        return '' if self.slim_doctree else text
 
     def get_frontmatter(self, string):
         frontmatter = {}
@@ -123,7 +197,16 @@ class MarkdownParser(parsers.Parser):
         if len(frontmatter_regex) and len(frontmatter_regex[0]):
             frontmatter_string = frontmatter_regex[0][0]
         if len(frontmatter_string):
-            frontmatter = yaml.safe_load(frontmatter_string)
+            env = getattr(self.document.settings, 'env', None)
+            key = ('frontmatter', content_hash(frontmatter_string))
+            frontmatter = None if env is None else shared_get(env, key)
+            if frontmatter is None:
+                import yaml
+                start = time.perf_counter()
+                frontmatter = yaml.safe_load(frontmatter_string)
+                if env is not None:
+                    shared_put(env, key, frontmatter,
+                               time.perf_counter() - start)
         return frontmatter
 
     def get_md(self, string):
@@ -245,7 +328,9 @@ class MarkdownParser(parsers.Parser):
             else:
                 self.document.reporter.warning(
                     "aborting attempt to parse invalid raw code block", nodes.Text(text1))
-                content = nodes.raw(text1, text1, format='html')
+                content = nodes.raw(
+                    self.text_source(text1), text1, format='html'
+                )
             strip_p = True
 
         else:
@@ -253,7 +338,7 @@ class MarkdownParser(parsers.Parser):
             # hacky heuristic to determine whether to strip <p> or not
             if not all((t in TAGS_INLINE for t in tags)):
                 strip_p = True
-            content = nodes.raw(text1, text1, format='html')
+            content = nodes.raw(self.text_source(text1), text1, format='html')
 
         parent = self.parse_stack_w[-1]
         if strip_p and len(parent) == 0 and isinstance(parent, nodes.paragraph):
@@ -375,6 +460,7 @@ class MarkdownParser(parsers.Parser):
         try:
             r = urllib.parse.urlparse(href)
             if r.path.endswith(".md"):
+              note_link_dependency(self.document, href)
               href = urllib.parse.urlunparse(r._replace(path = r.path[:-3] + ".html"))
         except:
             pass
@@ -0,0 +1,118 @@
+"""Decide from content hashes which markdown documents changed.
+
+Sphinx re-reads a document when the modification time of its source or
+of one of its dependencies is newer than the last read, which is the case
+for every file after a fresh checkout. The content hashes of markdown
+sources and their dependencies are recorded when they are read, and
+documents whose hashes did not change are dropped from the documents
+Sphinx considers changed.
+"""
+
+import hashlib
+import os
+import time
+
+from .config import get_build_config
+from .parse_cache import config_fingerprint
+
+def file_hash(path):
+    """Return the hash of the content of ``path``, or None."""
+    digest = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+def enabled(app):
+    return get_build_config(app)['content_hash_outdated']
+
+def get_hashes(env):
+    """Return the ``{docname: (source hash, config, dependency hashes)}``
+    recorded in ``env``."""
+    hashes = getattr(env, 'markdown_source_hashes', None)
+    if hashes is None:
+        hashes = env.markdown_source_hashes = {}
+    return hashes
+
+def hash_sources(app, env, docnames):
+    """Hash the markdown sources about to be read.
+
+    Connected to ``env-before-read-docs``; the hashes are only stored in
+    the environment once the documents were read.
+    """
+    from .slim import is_markdown_document
+    app._markdown_pending_hashes = pending = {}
+    if not enabled(app):
+        return
+    for docname in docnames:
+        if is_markdown_document(app, docname):
+            pending[docname] = file_hash(env.doc2path(docname))
+
+def record_hashes(app, env):
+    """Record the hashes of the documents read and their dependencies."""
+    pending = getattr(app, '_markdown_pending_hashes', None)
+    if not pending:
+        return
+    hashes = get_hashes(env)
+    fingerprint = config_fingerprint(get_build_config(app))
+    for docname, source_hash in pending.items():
+        if docname not in env.all_docs:
+            continue
+        dependencies = {
+            dep: file_hash(os.path.join(env.srcdir, dep))
+            for dep in env.dependencies.get(docname, ())
+        }
+        hashes[docname] = (source_hash, fingerprint, dependencies)
+    pending.clear()
+
+def purge_hashes(app, env, docname):
+    get_hashes(env).pop(docname, None)
+
+def is_unchanged(env, docname, record, fingerprint):
+    source_hash, config, dependencies = record
+    if config != fingerprint or source_hash is None:
+        return False
+    if docname in env.reread_always or not os.path.isfile(
+        os.path.join(env.doctreedir, docname + '.doctree')
+    ):
+        return False
+    if set(dependencies) != set(env.dependencies.get(docname, ())):
+        return False
+    if file_hash(env.doc2path(docname)) != source_hash:
+        return False
+    return all(
+        file_hash(os.path.join(env.srcdir, dep)) == dep_hash
+        for dep, dep_hash in dependencies.items()
+    )
+
+def discard_unchanged(app, env, added, changed, removed):
+    """Drop the markdown documents whose content did not change.
+
+    Connected to ``env-get-outdated``; ``changed`` is updated in place.
+    """
+    from sphinx.environment import CONFIG_OK
+    from sphinx.util import logging
+    logger = logging.getLogger(__name__)
+    hashes = getattr(env, 'markdown_source_hashes', None)
+    if not hashes or not enabled(app) or env.config_status != CONFIG_OK:
+        return []
+    fingerprint = config_fingerprint(get_build_config(app))
+    unchanged = [
+        docname for docname in sorted(changed)
+        if docname in hashes
+        and is_unchanged(env, docname, hashes[docname], fingerprint)
+    ]
+    now = time.time()
+    for docname in unchanged:
+        changed.discard(docname)
+        # spare the next build the hashing until the file is touched again
+        env.all_docs[docname] = max(
+            now, os.path.getmtime(env.doc2path(docname))
+        )
+    if unchanged:
+        logger.info('%d markdown documents with unchanged content',
+                    len(unchanged))
+    return []
@@ -0,0 +1,197 @@
+"""On-disk cache of parsed markdown documents.
+
+The cache is filled ahead of a Sphinx build by the ``md2cache`` command
+and consulted by the markdown parsers when ``parse_cache_dir`` is set.
+It holds the doctree a parser produced before any transform ran.
+"""
+
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+
+import docutils
+from docutils import nodes
+
+from . import __version__
+from .config import get_config
+
+# bump when the layout of the cached payloads changes
+CACHE_VERSION = 1
+
+def config_fingerprint(config):
+    """Return a string identifying the values of ``config``.
+
+    Callables are identified by their qualified name.
+    """
+    items = []
+    for name, value in sorted((config or {}).items()):
+        if callable(value):
+            value = '%s.%s' % (
+                getattr(value, '__module__', None),
+                getattr(value, '__qualname__', None)
+            )
+        items.append((name, value))
+    return repr(items)
+
+@functools.lru_cache(maxsize=None)
+def library_versions():
+    """Return the versions of the libraries the doctrees are built with.
+
+    The versions of the markdown libraries are read from their metadata,
+    without importing them.
+    """
+    try:
+        from importlib.metadata import version as get_version
+    except ImportError:  # Python < 3.8
+        import pkg_resources
+
+        def get_version(distribution):
+            return pkg_resources.get_distribution(distribution).version
+    versions = ['docutils ' + docutils.__version__]
+    for distribution in ('Markdown', 'commonmark'):
+        try:
+            version = get_version(distribution)
+        except Exception:  # not installed
+            version = None
+        versions.append('%s %s' % (distribution, version))
+    return ', '.join(versions)
+
+class ParseCache:
+    """Store the doctrees of parsed documents below ``directory``.
+
+    Entries are keyed by the versions of this package and of the libraries
+    it parses with, the parser class, the config, the source path and the
+    source text, so stale entries are never returned; they are simply
+    not looked up any more.
+    """
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, parser, source, text, config):
+        """Return the cache key of parsing ``text`` with ``parser``."""
+        parser_class = type(parser)
+        parts = (
+            str(CACHE_VERSION),
+            __version__,
+            library_versions(),
+            '%s.%s' % (parser_class.__module__, parser_class.__qualname__),
+            config_fingerprint(config),
+            config_fingerprint(getattr(parser, 'config_overrides', None)),
+            source,
+            text,
+        )
+        digest = hashlib.sha1()
+        for part in parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.pickle')
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def load(self, key):
+        """Return the payload stored for ``key`` or ``None``."""
+        try:
+            with open(self.path(key), 'rb') as f:
+                payload = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return payload
+
+    def store(self, key, payload):
+        """Store ``payload`` for ``key``, atomically."""
+        path = self.path(key)
+        dirname = os.path.dirname(path)
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(payload, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def restore(self, parser, text, document):
+        """Fill ``document`` from the cache and return whether it was found.
+
+        The targets the parser registered and the source files it linked
+        are registered again with the new document.
+        """
+        from .dependencies import note_link_dependency
+        config = get_config(document.settings)
+        payload = self.load(
+            self.key(parser, document['source'], text, config)
+        )
+        if payload is None:
+            return False
+        document.extend(payload['children'])
+        elements = []
+        for node in iter_nodes(document.children):
+            node.document = document
+            if isinstance(node, nodes.Element):
+                elements.append(node)
+        for index, explicit in payload['targets']:
+            if explicit:
+                document.note_explicit_target(elements[index])
+            else:
+                document.note_implicit_target(elements[index])
+        for uri in payload['links']:
+            note_link_dependency(document, uri)
+        return True
+
+def iter_nodes(node_list):
+    for node in node_list:
+        for descendant in node.traverse():
+            yield descendant
+
+def capture_parse(document):
+    """Detach the parsed content of ``document`` into a cache payload.
+
+    ``document`` must have been given a ``markdown_links`` list before it
+    was parsed, and is unusable afterwards.
+    """
+    registered = {id(node) for node in document.ids.values()}
+    targets = []
+    index = 0
+    for node in iter_nodes(document.children):
+        # nodes refer to the document, its settings and the environment
+        node.document = None
+        if not isinstance(node, nodes.Element):
+            continue
+        if id(node) in registered:
+            explicit = any(
+                document.nametypes.get(name) for name in node['names']
+            )
+            targets.append((index, explicit))
+        index += 1
+    children = list(document.children)
+    for child in children:
+        child.parent = None
+    return {
+        'children': children,
+        'links': list(document.markdown_links),
+        'targets': targets,
+    }
+
+def get_parse_cache(settings):
+    """Return the parse cache of a Sphinx build, if one is configured."""
+    env = getattr(settings, 'env', None)
+    config = get_config(settings)
+    if env is None or config is None or not config['parse_cache_dir']:
+        return None
+    app = env.app
+    directory = os.path.join(app.confdir, config['parse_cache_dir'])
+    cache = getattr(app, '_markdown_parse_cache', None)
+    if cache is None or cache.directory != os.path.abspath(directory):
+        cache = app._markdown_parse_cache = ParseCache(directory)
+    return cache
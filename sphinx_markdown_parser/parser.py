@@ -1,2 +1,26 @@
-from .commonmark_parser import CommonMarkParser
-from .markdown_parser import MarkdownParser
+"""The markdown parsers, each imported on first use.
+
+Importing one parser does not import the markdown library of the other.
+"""
+
+import importlib
+
+__all__ = ['CommonMarkParser', 'MarkdownParser']
+
+_modules = {
+    'CommonMarkParser': '.commonmark_parser',
+    'MarkdownParser': '.markdown_parser',
+}
+
+def __getattr__(name):
+    module = _modules.get(name)
+    if module is None:
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name)
+        )
+    value = getattr(importlib.import_module(module, __package__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,176 @@
+"""Render markdown strings in process, at high throughput.
+
+``docutils.core.publish_parts`` builds an option parser, the settings and
+a new parser, reader and writer on every call, which costs more than
+rendering a small snippet. The functions of this module keep the settings
+of every writer, parser and settings overrides once computed, and pools of
+idle converters, each with its own parser, reader and writer.
+
+>>> render_html_body('Some *text*')
+'<p>Some <em>text</em></p>\\n'
+"""
+
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .convert import Converter, copy_settings
+
+__all__ = ['get_settings', 'render_html_body', 'render_many', 'render_parts']
+
+# idle converters kept per writer, parser and overrides
+POOL_SIZE = 8
+
+# rendered parts are returned as text
+DEFAULT_OVERRIDES = {'output_encoding': 'unicode'}
+
+# the title stays in the body rendered by render_html_body
+BODY_OVERRIDES = {'doctitle_xform': False}
+
+class ConverterPool:
+    """Idle converters of one writer, parser class and settings.
+
+    The settings are computed for the first converter and shared by the
+    others. Every conversion works on its own copy of them, lists
+    included.
+    """
+    def __init__(self, writer_name, parser_class, settings_overrides,
+                 maxsize=POOL_SIZE):
+        self.writer_name = writer_name
+        self.parser_class = parser_class
+        self.settings_overrides = settings_overrides
+        self.maxsize = maxsize
+        self.settings = None
+        self.frozen_settings = None
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Return an idle converter or a new one."""
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        converter = Converter(
+            self.writer_name, self.settings_overrides, self.settings,
+            self.parser_class
+        )
+        self.settings = converter.settings
+        return converter
+
+    def release(self, converter):
+        with self.lock:
+            if len(self.idle) < self.maxsize:
+                self.idle.append(converter)
+
+class FrozenSettings:
+    """Read-only view of settings shared by converters.
+
+    List values are returned as tuples; `copy` returns settings that can
+    be changed.
+    """
+    def __init__(self, settings):
+        object.__setattr__(self, '_settings', settings)
+
+    def __getattr__(self, name):
+        value = getattr(self._settings, name)
+        if isinstance(value, list):
+            return tuple(value)
+        return value
+
+    def __setattr__(self, name, value):
+        raise AttributeError('shared settings are read-only')
+
+    __delattr__ = __setattr__
+
+    def __dir__(self):
+        return dir(self._settings)
+
+    def copy(self):
+        return copy_settings(self._settings)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(writer_name, parser_class, settings_overrides):
+    overrides = dict(DEFAULT_OVERRIDES, **(settings_overrides or {}))
+    key = (writer_name, parser_class, repr(sorted(overrides.items())))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(
+                key, ConverterPool(writer_name, parser_class, overrides)
+            )
+    return pool
+
+def get_settings(writer_name='html', settings_overrides=None,
+                 parser_class=None):
+    """Return a read-only view of the cached settings of a writer, parser
+    and overrides.
+    """
+    pool = get_pool(writer_name, parser_class, settings_overrides)
+    if pool.frozen_settings is None:
+        if pool.settings is None:
+            pool.release(pool.acquire())
+        pool.frozen_settings = FrozenSettings(pool.settings)
+    return pool.frozen_settings
+
+def render_parts(text, writer_name='html', settings_overrides=None,
+                 parser_class=None, source_path=None):
+    """Render the markdown ``text`` and return the parts of the output.
+
+    Parameters
+    ----------
+    text : str
+        The markdown source.
+    writer_name : str
+        Name of the docutils writer.
+    settings_overrides : dict
+        Settings that differ from the defaults of the writer.
+    parser_class : type
+        The markdown parser, `MarkdownParser` by default.
+    source_path : str
+        Path of the source reported in system messages.
+
+    Returns
+    -------
+    parts : dict
+        The parts of the output, as with ``docutils.core.publish_parts``.
+    """
+    pool = get_pool(writer_name, parser_class, settings_overrides)
+    converter = pool.acquire()
+    try:
+        return converter.convert_parts(text, source_path)
+    finally:
+        pool.release(converter)
+
+def render_html_body(text, settings_overrides=None, parser_class=None,
+                     source_path=None):
+    """Render the markdown ``text`` to HTML, without the wrapping
+    ``<div class="document">``.
+
+    The document title, if any, is part of the output.
+    """
+    overrides = dict(BODY_OVERRIDES, **(settings_overrides or {}))
+    return render_parts(
+        text, 'html', overrides, parser_class, source_path
+    )['body']
+
+def render_many(texts, writer_name='html', settings_overrides=None,
+                parser_class=None, max_workers=None, executor=None):
+    """Render each of the markdown ``texts`` and return their parts, in
+    order.
+
+    The texts are rendered on a pool of ``max_workers`` threads, each
+    rendering with a converter of its own, and the parts come back without
+    being pickled. Threads only render in parallel on free-threaded Python
+    builds; ``executor`` runs the renders on any ``concurrent.futures``
+    executor instead, such as a process pool.
+    """
+    render = functools.partial(
+        render_parts, writer_name=writer_name,
+        settings_overrides=settings_overrides, parser_class=parser_class
+    )
+    if executor is not None:
+        return list(executor.map(render, texts))
+    with ThreadPoolExecutor(max_workers) as executor:
+        return list(executor.map(render, texts))
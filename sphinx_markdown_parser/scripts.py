@@ -8,68 +8,61 @@ Date: 2013-08-25
 Description: Scripts loaded by setuptools entry points
 """
 
+import sys
+
 try:
     import locale
     locale.setlocale(locale.LC_ALL, '')
 except ImportError:
     pass
 
-from docutils.core import publish_cmdline, default_description
-from sphinx_markdown_parser.parser import MarkdownParser
+from docutils.core import default_description
+from sphinx_markdown_parser.convert import formats_main, main
 
 def md2html():
     description = (
         'Generate html document from markdown sources. ' + default_description
     )
-    publish_cmdline(
-        writer_name='html', parser=MarkdownParser(), description=description
-    )
+    sys.exit(main('html', description))
 
 def md2man():
     description = (
         'Generate a manpage from markdown sources. ' + default_description
     )
-    publish_cmdline(
-        writer_name='manpage',
-        parser=MarkdownParser(),
-        description=description
-    )
+    sys.exit(main('manpage', description))
 
 def md2xml():
     description = (
         'Generate XML document from markdown sources. ' + default_description
     )
-    publish_cmdline(
-        writer_name='xml', parser=MarkdownParser(), description=description
-    )
+    sys.exit(main('xml', description))
 
 def md2pseudoxml():
     description = (
         'Generate pseudo-XML document from markdown sources. ' +
         default_description
     )
-    publish_cmdline(
-        writer_name='pseudoxml',
-        parser=MarkdownParser(),
-        description=description
-    )
+    sys.exit(main('pseudoxml', description))
 
 def md2latex():
     description = (
         'Generate latex document from markdown sources. ' + default_description
     )
-    publish_cmdline(
-        writer_name='latex',
-        parser=MarkdownParser(),
-        description=description
-    )
+    sys.exit(main('latex', description))
 
 def md2xetex():
     description = (
         'Generate xetex document from markdown sources. ' + default_description
     )
-    publish_cmdline(
-        writer_name='latex',
-        parser=MarkdownParser(),
-        description=description
+    sys.exit(main('latex', description))
+
+def md2cache():
+    from sphinx_markdown_parser import warmup
+    sys.exit(warmup.main())
+
+def md2multi():
+    description = (
+        'Generate documents in several formats from a markdown source, '
+        'parsing it once. ' + default_description
     )
+    sys.exit(formats_main(description))
@@ -0,0 +1,150 @@
+"""Cache shared by the processes of a parallel Sphinx build.
+
+Under ``sphinx-build -j N`` every read worker is a fresh fork, so the
+per-build caches of `cache` start out empty in each of them and equal
+``eval_rst`` fragments or frontmatter are parsed again by every worker.
+With the ``shared_cache`` option a cache server process is started when
+the builder is initialized; the workers look up what they miss locally
+in it and store what they parse, by content hash.
+"""
+
+import multiprocessing
+import pickle
+import threading
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+
+from .config import get_build_config
+
+class SharedCache:
+    """Keep at most ``max_bytes`` of pickled values, least recently used
+    first out.
+
+    Lives in the server process, the workers talk to it through a proxy.
+    Each value is stored with the time it took to compute, which is
+    counted as saved whenever the value is reused.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'rejected': 0,
+            'saved_seconds': 0.0,
+        }
+
+    def get(self, key):
+        """Return the value stored for ``key`` or None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats['hits'] += 1
+            self.stats['saved_seconds'] += entry[1]
+            return entry[0]
+
+    def put(self, key, value, cost):
+        """Store the bytes ``value`` that took ``cost`` seconds to compute.
+
+        Returns whether the value was stored; values larger than the whole
+        cache are not.
+        """
+        if len(value) > self.max_bytes:
+            with self._lock:
+                self.stats['rejected'] += 1
+            return False
+        with self._lock:
+            if key in self._data:
+                return False
+            self._data[key] = (value, cost)
+            self.size += len(value)
+            self.stats['stores'] += 1
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._data.popitem(last=False)
+                self.size -= len(evicted)
+                self.stats['evictions'] += 1
+        return True
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._data)
+            stats['bytes'] = self.size
+        return stats
+
+class SharedCacheManager(BaseManager):
+    pass
+
+SharedCacheManager.register('SharedCache', SharedCache)
+
+def start_shared_cache(app):
+    """Start the cache server for a parallel build, if enabled.
+
+    Connected to ``builder-inited``, so the read workers forked later
+    inherit the proxy.
+    """
+    app._markdown_shared_cache = None
+    config = get_build_config(app)
+    if not config['shared_cache'] or app.parallel <= 1 or (
+        'fork' not in multiprocessing.get_all_start_methods()
+    ):
+        return
+    manager = SharedCacheManager(ctx=multiprocessing.get_context('fork'))
+    manager.start()
+    app._markdown_shared_cache_manager = manager
+    app._markdown_shared_cache = manager.SharedCache(
+        config['shared_cache_max_bytes']
+    )
+
+def stop_shared_cache(app, exception):
+    """Report what the shared cache saved and stop its server."""
+    manager = getattr(app, '_markdown_shared_cache_manager', None)
+    if manager is None:
+        return
+    from sphinx.util import logging
+    logger = logging.getLogger(__name__)
+    try:
+        stats = app._markdown_shared_cache.get_stats()
+    except (EOFError, OSError):
+        stats = None
+    manager.shutdown()
+    app._markdown_shared_cache = None
+    app._markdown_shared_cache_manager = None
+    app._markdown_shared_cache_stats = stats
+    if stats is not None:
+        logger.info(
+            'shared markdown cache: %d hits, %d misses, %d entries '
+            '(%d bytes), %.3fs of parsing saved',
+            stats['hits'], stats['misses'], stats['entries'],
+            stats['bytes'], stats['saved_seconds']
+        )
+
+def shared_get(env, key):
+    """Return the value shared for ``key`` by another worker, or None."""
+    cache = getattr(env.app, '_markdown_shared_cache', None)
+    if cache is None:
+        return None
+    try:
+        value = cache.get(key)
+    except (EOFError, OSError):
+        # the server is gone, carry on without it
+        env.app._markdown_shared_cache = None
+        return None
+    return None if value is None else pickle.loads(value)
+
+def shared_put(env, key, value, cost):
+    """Share ``value``, which took ``cost`` seconds to compute."""
+    cache = getattr(env.app, '_markdown_shared_cache', None)
+    if cache is None:
+        return
+    try:
+        cache.put(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), cost)
+    except (EOFError, OSError):
+        env.app._markdown_shared_cache = None
@@ -0,0 +1,44 @@
+"""Drop redundant copies of text from markdown doctrees."""
+
+from docutils import nodes
+
+from .config import get_build_config
+
+# literal_block is left alone: the writers only highlight literal blocks
+# whose rawsource matches their text
+SLIM_NODES = (nodes.Text, nodes.literal, nodes.raw)
+
+def slim_doctree(doctree):
+    """Clear the rawsource of nodes where it only repeats their text."""
+    for node in doctree.traverse():
+        if isinstance(node, SLIM_NODES) and node.rawsource and (
+            node.rawsource == node.astext()
+        ):
+            node.rawsource = ''
+
+def is_markdown_document(app, docname):
+    """Return whether ``docname`` is read by one of the markdown parsers."""
+    from sphinx.errors import FiletypeNotFoundError
+    from sphinx.util import get_filetype
+    from .parser import CommonMarkParser, MarkdownParser
+    try:
+        filetype = get_filetype(
+            app.config.source_suffix, app.env.doc2path(docname)
+        )
+    except FiletypeNotFoundError:
+        return False
+    parser_class = app.registry.get_source_parsers().get(filetype)
+    return bool(parser_class) and issubclass(
+        parser_class, (CommonMarkParser, MarkdownParser)
+    )
+
+def slim_markdown_doctree(app, doctree):
+    """Slim the doctrees of markdown documents before Sphinx pickles them.
+
+    Sphinx fills empty rawsource attributes in with the text of the node
+    while reading, so the parsers alone cannot keep them empty.
+    """
+    if get_build_config(app)['slim_doctree'] and is_markdown_document(
+        app, app.env.docname
+    ):
+        slim_doctree(doctree)
@@ -0,0 +1,68 @@
+"""In-memory index of the files in a Sphinx source tree."""
+
+import os
+
+class SourceIndex:
+    """Answer file existence checks below ``root`` from memory.
+
+    Directories are listed lazily, the first time a path inside them is
+    looked up, so only the parts of the tree that documents actually link
+    to are read. `refresh` re-lists the directories whose modification
+    time changed since they were listed, which costs one ``stat`` per
+    known directory instead of one per lookup.
+    """
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        # directory -> (mtime, names of its entries)
+        self._listings = {}
+
+    def refresh(self):
+        """Drop the listings of directories that changed on disk."""
+        for dirname, (mtime, _) in list(self._listings.items()):
+            try:
+                changed = os.stat(dirname).st_mtime_ns != mtime
+            except OSError:
+                changed = True
+            if changed:
+                del self._listings[dirname]
+
+    def listdir(self, dirname):
+        """Return the set of entry names of ``dirname``."""
+        listing = self._listings.get(dirname)
+        if listing is None:
+            try:
+                mtime = os.stat(dirname).st_mtime_ns
+                names = frozenset(os.listdir(dirname))
+            except OSError:
+                mtime, names = None, frozenset()
+            listing = self._listings[dirname] = (mtime, names)
+        return listing[1]
+
+    def exists(self, path):
+        """Return whether the absolute ``path`` exists in the source tree.
+
+        Paths outside of the root fall back to ``os.path.exists``.
+        """
+        if path == self.root:
+            return True
+        if not path.startswith(self.root + os.sep):
+            return os.path.exists(path)
+        dirname, name = os.path.split(path)
+        return self.exists(dirname) and name in self.listdir(dirname)
+
+def get_source_index(env):
+    """Return the source index of the Sphinx environment ``env``.
+
+    The index is created once per build and kept on the application
+    object, which is not pickled with the environment.
+    """
+    index = getattr(env.app, '_markdown_source_index', None)
+    if index is None or index.root != os.path.abspath(env.srcdir):
+        index = env.app._markdown_source_index = SourceIndex(env.srcdir)
+    return index
+
+def refresh_source_index(app, env, docnames):
+    """Refresh the source index before Sphinx (re)reads documents."""
+    index = getattr(app, '_markdown_source_index', None)
+    if index is not None:
+        index.refresh()
@@ -0,0 +1,390 @@
+"""Split oversized markdown sources into sub-documents.
+
+A markdown document larger than ``split_threshold`` bytes is cut at its
+ATX headings of level ``split_heading_level``. Each part is
+written to its own file below ``split_dir`` in the source directory, so
+Sphinx reads the parts as separate documents, in parallel when asked to.
+A manifest in ``split_dir`` lists the parts, the only files the splitter
+overwrites or removes, and removed once splitting is turned off.
+The original document keeps the text before the first of these headings
+and gets a toctree of its parts. Links to ``#anchors`` of headings that
+moved to another part are rewritten to point at that part, in the split
+document and in the documents linking it.
+"""
+
+import io
+import os
+import posixpath
+import re
+import urllib.parse
+
+from docutils import nodes
+
+from .config import get_build_config
+
+ATX_HEADING = re.compile(
+    r'^ {0,3}(#{1,6})(?:[ \t]+|$)(.*?)(?:[ \t]+#+)?[ \t]*$'
+)
+FENCE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+ANCHOR_LINK = re.compile(r'(\]\(\s*)#([^)\s]+)')
+ANCHOR_DEFINITION = re.compile(r'^( {0,3}\[[^\]]+\]:[ \t]*)#(\S+)')
+
+def iter_lines(text):
+    """Yield the lines of ``text`` and whether they are in a code fence."""
+    fence = None
+    for line in text.splitlines(True):
+        match = FENCE.match(line)
+        if fence is None and match:
+            fence = match.group(1)
+            yield line, True
+        elif fence is not None:
+            if match and match.group(1)[0] == fence[0] and (
+                len(match.group(1)) >= len(fence)
+            ) and not line[match.end():].strip():
+                fence = None
+            yield line, True
+        else:
+            yield line, False
+
+def heading_of(line):
+    """Return ``(level, title)`` of an ATX heading line, or None."""
+    match = ATX_HEADING.match(line.rstrip('\n'))
+    if match is None:
+        return None
+    return len(match.group(1)), match.group(2).strip()
+
+def heading_anchors(title):
+    """Return the ids the markdown parsers may give the section ``title``."""
+    from .markdown_parser import to_html_anchor
+    anchors = {nodes.make_id(nodes.fully_normalize_name(title))}
+    anchors.add(to_html_anchor(title))
+    anchors.discard('')
+    return anchors
+
+def split_source(text, level):
+    """Split markdown ``text`` at its headings of ``level``.
+
+    Headings of a higher rank start a part too, once the first part has
+    started, so that a leading title stays in the preamble.
+
+    Returns
+    -------
+    preamble : str
+        The text before the first of these headings.
+    parts : list of (str, str)
+        The title and text of each part.
+    """
+    preamble, parts = [], []
+    current = preamble
+    for line, fenced in iter_lines(text):
+        heading = None if fenced else heading_of(line)
+        if heading is not None and (
+            heading[0] == level or heading[0] < level and parts
+        ):
+            current = [line]
+            parts.append((heading[1], current))
+        else:
+            current.append(line)
+    return ''.join(preamble), [(t, ''.join(lines)) for t, lines in parts]
+
+def rewrite_anchor_links(text, anchors, current, suffix):
+    """Point ``#anchor`` links of ``text`` to the document of the anchor.
+
+    ``anchors`` maps anchors to the docnames of the documents holding
+    them, ``current`` is the docname of ``text`` and ``suffix`` the source
+    suffix of the documents.
+    """
+    def target(anchor):
+        docname = anchors.get(anchor)
+        if docname is None or docname == current:
+            return None
+        return posixpath.relpath(docname, posixpath.dirname(current))
+
+    def replace(match):
+        path = target(match.group(2))
+        if path is None:
+            return match.group(0)
+        return '%s%s%s#%s' % (match.group(1), path, suffix, match.group(2))
+
+    lines = []
+    for line, fenced in iter_lines(text):
+        if not fenced:
+            line = ANCHOR_LINK.sub(replace, line)
+            line = ANCHOR_DEFINITION.sub(replace, line)
+        lines.append(line)
+    return ''.join(lines)
+
+class SplitDocument:
+    """A markdown document split into a preamble and parts.
+
+    Parameters
+    ----------
+    docname : str
+        The docname of the original document.
+    preamble : str
+        The text the original document keeps.
+    parts : list of (str, str)
+        The docname and text of each part.
+    suffix : str
+        The source suffix of the original document and its parts.
+    anchors : dict
+        The docname of the document holding each anchor.
+    """
+    def __init__(self, docname, preamble, parts, suffix, anchors=None):
+        self.docname = docname
+        self.preamble = preamble
+        self.parts = parts
+        self.suffix = suffix
+        self.anchors = anchors or {}
+
+    @property
+    def docnames(self):
+        return [docname for docname, _ in self.parts]
+
+def split_document(docname, text, suffix, config):
+    """Split ``text`` into a `SplitDocument`, or return None.
+
+    The parts of ``docname`` are named ``<split_dir>/<docname>/<n>-<id>``.
+    """
+    preamble, parts = split_source(text, config['split_heading_level'])
+    if not parts:
+        return None
+    width = len(str(len(parts)))
+    docnames = [docname]
+    for index, (title, _) in enumerate(parts, 1):
+        slug = nodes.make_id(title) or 'part'
+        docnames.append(posixpath.join(
+            config['split_dir'], docname, '%0*d-%s' % (width, index, slug)
+        ))
+    anchors = {}
+    texts = [preamble] + [part for _, part in parts]
+    for current, chunk in zip(docnames, texts):
+        for line, fenced in iter_lines(chunk):
+            heading = None if fenced else heading_of(line)
+            if heading is not None:
+                for anchor in heading_anchors(heading[1]):
+                    anchors.setdefault(anchor, current)
+    texts = [
+        rewrite_anchor_links(chunk, anchors, current, suffix)
+        for current, chunk in zip(docnames, texts)
+    ]
+    return SplitDocument(
+        docname, texts[0], list(zip(docnames[1:], texts[1:])), suffix,
+        anchors
+    )
+
+def write_if_changed(path, text, encoding):
+    """Write ``text`` to ``path`` unless it already holds it.
+
+    Unchanged parts keep their modification time, so Sphinx does not read
+    them again.
+    """
+    try:
+        with io.open(path, encoding=encoding) as f:
+            if f.read() == text:
+                return
+    except (OSError, UnicodeDecodeError):
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with io.open(path, 'w', encoding=encoding) as f:
+        f.write(text)
+
+# lists the parts written below split_dir, the only files removed from it
+MANIFEST = '.markdown-split-parts'
+
+def read_manifest(split_root):
+    """Return the normalized paths of the parts written by the last build."""
+    try:
+        with io.open(os.path.join(split_root, MANIFEST),
+                     encoding='utf-8') as f:
+            return {
+                os.path.normpath(os.path.join(split_root, line))
+                for line in f.read().splitlines() if line
+            }
+    except OSError:
+        return set()
+
+def write_manifest(split_root, paths):
+    path = os.path.join(split_root, MANIFEST)
+    if not paths:
+        if os.path.exists(path):
+            os.remove(path)
+            if not os.listdir(split_root):
+                os.rmdir(split_root)
+        return
+    write_if_changed(path, ''.join(
+        os.path.relpath(part, split_root).replace(os.path.sep, '/') + '\n'
+        for part in sorted(paths)
+    ), 'utf-8')
+
+def remove_stale_parts(split_root, paths, written):
+    """Remove the parts in ``written`` that are not in ``paths``.
+
+    ``written`` holds the parts listed in the manifest of the last build,
+    so files of ``split_root`` that the splitter did not write are left
+    alone. The directories left empty are removed, up to ``split_root``.
+    """
+    for path in sorted(written - paths):
+        if os.path.isfile(path):
+            os.remove(path)
+        directory = os.path.dirname(path)
+        while directory.startswith(split_root) and (
+            os.path.isdir(directory) and not os.listdir(directory)
+        ):
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
+
+def split_sources(app):
+    """Split the oversized markdown documents of the project.
+
+    Connected to ``builder-inited``, before Sphinx looks for documents.
+    Parts are only written over files that the splitter wrote, as listed
+    in the manifest of ``split_dir``; a document whose parts would
+    overwrite another file, or cannot be written, is not split. The parts
+    of the manifest are removed once splitting is turned off.
+    """
+    from sphinx.project import Project
+    from sphinx.util import logging
+    from .slim import is_markdown_document
+    logger = logging.getLogger(__name__)
+    app._markdown_splits = splits = {}
+    config = get_build_config(app)
+    split_root = os.path.normpath(
+        os.path.join(app.srcdir, config['split_dir'])
+    )
+    written = read_manifest(split_root)
+    if not config['split_threshold']:
+        if written:
+            remove_stale_parts(split_root, set(), written)
+            write_manifest(split_root, set())
+        return
+    project = Project(app.srcdir, app.config.source_suffix)
+    excludes = list(app.config.exclude_patterns) + list(
+        app.config.templates_path
+    ) + [
+        os.path.relpath(path, app.srcdir).replace(os.path.sep, '/')
+        for path in written
+    ]
+    suffixes = tuple(app.config.source_suffix)
+    # the parts of this build, and all the parts it wrote
+    paths, created = set(), set()
+    for docname in sorted(project.discover(excludes)):
+        path = project.doc2path(docname)
+        if os.path.getsize(path) < config['split_threshold'] or (
+            not is_markdown_document(app, docname)
+        ):
+            continue
+        with io.open(path, encoding=app.config.source_encoding) as f:
+            text = f.read()
+        suffix = next(s for s in suffixes if path.endswith(s))
+        split = split_document(docname, text, suffix, config)
+        if split is None:
+            continue
+        part_paths = [
+            os.path.normpath(os.path.join(app.srcdir, part + suffix))
+            for part in split.docnames
+        ]
+        clash = next((
+            part_path for part_path in part_paths
+            if part_path not in written and os.path.exists(part_path)
+        ), None)
+        if clash is not None:
+            logger.warning('not splitting %s: its part %s would overwrite '
+                           'a file the splitter did not write', docname,
+                           os.path.relpath(clash, app.srcdir))
+            continue
+        try:
+            for part_path, (_, part_text) in zip(part_paths, split.parts):
+                created.add(part_path)
+                write_if_changed(
+                    part_path, part_text, app.config.source_encoding
+                )
+        except OSError as error:
+            logger.warning('not splitting %s: %s', docname, error)
+            continue
+        splits[docname] = split
+        paths.update(part_paths)
+    remove_stale_parts(split_root, paths, written | created)
+    if paths or written:
+        write_manifest(split_root, paths)
+
+def split_link_target(app, docname, uri):
+    """Return ``uri`` pointed at the part holding its anchor, or None.
+
+    ``uri`` is a link of the document ``docname`` to a split document,
+    relative or absolute to the source directory, with the source suffix
+    of the document or ``.html``.
+    """
+    splits = getattr(app, '_markdown_splits', None)
+    parts = urllib.parse.urlsplit(uri)
+    if not splits or parts.scheme or parts.netloc or not (
+        parts.path and parts.fragment
+    ):
+        return None
+    path, ext = posixpath.splitext(urllib.parse.unquote(parts.path))
+    if path.startswith('/'):
+        target = posixpath.normpath(path.lstrip('/'))
+    else:
+        target = posixpath.normpath(
+            posixpath.join(posixpath.dirname(docname), path)
+        )
+    split = splits.get(target)
+    if split is None:
+        return None
+    part = split.anchors.get(parts.fragment, target)
+    if part == target:
+        return None
+    if path.startswith('/'):
+        part_path = '/' + part
+    else:
+        part_path = posixpath.relpath(part, posixpath.dirname(docname))
+    return urllib.parse.urlunsplit(
+        parts._replace(path=urllib.parse.quote(part_path) + ext)
+    )
+
+def rewrite_split_links(app, doctree):
+    """Point the links of a document to anchors of split documents at the
+    parts now holding the anchors.
+
+    Connected to ``doctree-read``, for the documents linking a split
+    document; links within a split document are rewritten in its source.
+    """
+    if not getattr(app, '_markdown_splits', None):
+        return
+    docname = app.env.docname
+    for reference in doctree.traverse(nodes.reference):
+        uri = reference.get('refuri')
+        target = uri and split_link_target(app, docname, uri)
+        if target:
+            reference['refuri'] = target
+            parent = reference.parent
+            if parent.get('reftarget') == uri:
+                parent['reftarget'] = target
+
+def read_preamble(app, docname, source):
+    """Replace the source of a split document with its preamble."""
+    split = getattr(app, '_markdown_splits', {}).get(docname)
+    if split is not None:
+        source[0] = split.preamble
+
+def add_parts_toctree(app, doctree):
+    """Add the toctree of its parts to a split document.
+
+    Connected to ``doctree-read`` ahead of the environment collectors, which
+    register the toctree.
+    """
+    from .transform import new_toctree
+    split = getattr(app, '_markdown_splits', {}).get(app.env.docname)
+    if split is None:
+        return
+    docnames = split.docnames
+    toctree = new_toctree(
+        split.docname, [(None, docname) for docname in docnames], docnames,
+        None, get_build_config(app)['auto_toc_tree_maxdepth'], 0,
+        doctree['source'], None
+    )
+    sections = [
+        child for child in doctree.children
+        if isinstance(child, nodes.section)
+    ]
+    (sections[-1] if sections else doctree).append(toctree)
@@ -1,61 +1,145 @@
 """Implement statemachine and state that are needed to Generate Derivatives."""
 
+import threading
+
 from docutils.statemachine import StateMachineWS
 from docutils.parsers.rst import languages
 from docutils.parsers.rst.states import Struct, RSTState, Inliner
 from docutils.parsers.rst.roles import role
 from docutils.parsers.rst.directives import directive
 
+# language modules and inliner customizations only depend on a handful of
+# settings, so they are shared by every document with equal settings
+_languages = {}
+_inliner_customizations = {}
+_cache_lock = threading.Lock()
+
+def get_language(language_code):
+    """Return the (cached) rst language module for ``language_code``."""
+    language = _languages.get(language_code)
+    if language is None:
+        with _cache_lock:
+            language = _languages.get(language_code)
+            if language is None:
+                language = languages.get_language(language_code)
+                _languages[language_code] = language
+    return language
+
+def new_inliner(settings):
+    """Create an Inliner, reusing the customizations for equal settings.
+
+    ``Inliner.init_customizations`` compiles the whole inline markup regex
+    for every call; the compiled result is cached by the settings it reads
+    and set on the new instance. The implicit dispatch is cached by method
+    name and bound to the new instance, so the cache keeps no inliner, nor
+    its document, alive.
+    """
+    key = (
+        getattr(settings, 'character_level_inline_markup', False),
+        getattr(settings, 'pep_references', None),
+        getattr(settings, 'rfc_references', None),
+    )
+    inliner = Inliner()
+    customizations = _inliner_customizations.get(key)
+    if customizations is None:
+        inliner.init_customizations(settings)
+        customizations = {
+            name: getattr(inliner, name)
+            for name in ('patterns', 'start_string_prefix',
+                         'end_string_suffix', 'parts')
+        }
+        customizations['implicit_dispatch'] = [
+            (pattern, method.__name__)
+            for pattern, method in inliner.implicit_dispatch
+        ]
+        with _cache_lock:
+            _inliner_customizations.setdefault(key, customizations)
+        return inliner
+    inliner.__dict__.update(customizations)
+    inliner.implicit_dispatch = [
+        (pattern, getattr(inliner, name))
+        for pattern, name in customizations['implicit_dispatch']
+    ]
+    return inliner
+
 class DummyStateMachine(StateMachineWS):
     """A dummy state machine that mimicks the property of statemachine.
 
     This state machine cannot be used for parsing, it is only used to generate
     directive and roles. Usage:
-    - Call `reset` to reset the state
+    - Call `bind_document` once per document
+    - Call `set_parent` before generating each node
     - Then call `run_directive` or `run_role` to generate the node.
+
+    `reset` does both steps and only rebinds the document when it changed.
     """
     def __init__(self):
         self.memo = Struct(title_styles=[], inliner=None)
         self.state = RSTState(self)
         self.input_offset = 0
+        self.document = None
 
-    def reset(self, document, parent, level):
-        """Reset the state of state machine.
-
-        After reset, self and self.state can be used to
-        passed to docutils.parsers.rst.Directive.run
+    def bind_document(self, document):
+        """Prepare the per-document state of the state machine.
 
         Parameters
         ----------
         document: docutils document
-            Current document of the node.
-        parent: parent node
-            Parent node that will be used to interpret role and directives.
-        level: int
-            Current section level.
+            Document that the generated nodes will belong to.
         """
-        self.language = languages.get_language(document.settings.language_code)
+        self.language = get_language(document.settings.language_code)
         # setup memo
         self.memo.document = document
         self.memo.reporter = document.reporter
         self.memo.language = self.language
-        self.memo.section_level = level
         # setup inliner
         if self.memo.inliner is None:
-            self.memo.inliner = Inliner()
-            self.memo.inliner.init_customizations(document.settings)
+            self.memo.inliner = new_inliner(document.settings)
         inliner = self.memo.inliner
         inliner.reporter = document.reporter
         inliner.document = document
         inliner.language = self.language
-        inliner.parent = parent
         # setup self
         self.document = document
         self.reporter = self.memo.reporter
-        self.node = parent
+        self.node = document
         self.state.runtime_init()
         self.input_lines = document['source']
 
+    def set_parent(self, parent, level):
+        """Point the state machine to a new parent node.
+
+        Parameters
+        ----------
+        parent: parent node
+            Parent node that will be used to interpret role and directives.
+        level: int
+            Current section level.
+        """
+        self.memo.section_level = level
+        self.memo.inliner.parent = parent
+        self.node = parent
+        self.state.parent = parent
+
+    def reset(self, document, parent, level):
+        """Reset the state of state machine.
+
+        After reset, self and self.state can be used to
+        passed to docutils.parsers.rst.Directive.run
+
+        Parameters
+        ----------
+        document: docutils document
+            Current document of the node.
+        parent: parent node
+            Parent node that will be used to interpret role and directives.
+        level: int
+            Current section level.
+        """
+        if document is not self.document:
+            self.bind_document(document)
+        self.set_parent(parent, level)
+
     def run_directive(self, name, arguments=None, options=None, content=None):
         """Generate directive node given arguments.
 
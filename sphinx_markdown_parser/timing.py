@@ -0,0 +1,186 @@
+"""Per-document timings of the markdown parsing pipeline."""
+
+import io
+import json
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .config import get_build_config
+
+# number of documents listed in the text report
+REPORT_LIMIT = 25
+
+class PhaseTimer:
+    """Accumulate the durations of the named phases of one parse."""
+    def __init__(self):
+        self.durations = OrderedDict()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + (
+                time.perf_counter() - start
+            )
+
+    @property
+    def total(self):
+        return sum(self.durations.values())
+
+def record_timings(document, timer):
+    """Add the durations of ``timer`` to the timings of ``document``.
+
+    Timings are only kept when the extension is loaded with
+    ``collect_timings`` enabled.
+    """
+    env = getattr(document.settings, 'env', None)
+    timings = getattr(env, 'markdown_timings', None)
+    if timings is None:
+        return
+    durations = timings.setdefault(env.docname, {})
+    for phase, duration in timer.durations.items():
+        durations[phase] = durations.get(phase, 0.0) + duration
+
+def count_nodes(document):
+    return sum(1 for _ in document.traverse())
+
+def get_app(document):
+    """Return the Sphinx application reading ``document``, if any."""
+    env = getattr(document.settings, 'env', None)
+    return getattr(env, 'app', None)
+
+@contextmanager
+def instrument(document, stage, component, size=None):
+    """Time a stage of the pipeline working on ``document``.
+
+    Yields the `PhaseTimer` of the stage; its durations are recorded with
+    `record_timings`. When the extension is loaded, the
+    ``markdown-<stage>-start`` and ``markdown-<stage>-end`` events are
+    emitted around the stage with the docname and a dict of information:
+    the ``stage``, the ``component`` running it and the ``size`` of its
+    input in characters, plus, at the end, the wall clock ``start`` time, the
+    ``duration`` and ``phases`` in seconds and the number of ``nodes`` of
+    the document.
+    """
+    app = get_app(document)
+    start_event = 'markdown-%s-start' % stage
+    end_event = 'markdown-%s-end' % stage
+    if app is not None and start_event not in app.events.events:
+        app = None
+    info = {'stage': stage, 'component': component, 'size': size}
+    if app is not None:
+        app.emit(start_event, app.env.docname, dict(info))
+    timer = PhaseTimer()
+    start = time.time()
+    begin = time.perf_counter()
+    yield timer
+    duration = time.perf_counter() - begin
+    record_timings(document, timer)
+    # counting the nodes is only worth it for someone listening
+    if app is not None and app.events.listeners.get(end_event):
+        info.update(
+            start=start,
+            duration=duration,
+            phases=dict(timer.durations),
+            nodes=count_nodes(document),
+        )
+        app.emit(end_event, app.env.docname, info)
+
+def init_timings(app):
+    """Start collecting timings for this build if enabled."""
+    if get_build_config(app)['collect_timings']:
+        app.env.markdown_timings = {}
+    else:
+        app.env.markdown_timings = None
+
+def purge_timings(app, env, docname):
+    timings = getattr(env, 'markdown_timings', None)
+    if timings is not None:
+        timings.pop(docname, None)
+
+def merge_timings(app, env, docnames, other):
+    """Merge the timings collected by a parallel read worker."""
+    timings = getattr(env, 'markdown_timings', None)
+    other_timings = getattr(other, 'markdown_timings', None)
+    if timings is None or other_timings is None:
+        return
+    for docname in docnames:
+        if docname in other_timings:
+            timings[docname] = other_timings[docname]
+
+def collect_timings(app, env):
+    """Move the timings of the build from ``env`` to ``app``.
+
+    Connected to ``env-updated``: the timings travel with the environment
+    of the parallel read workers, but are not saved with the environment.
+    """
+    app._markdown_timings = vars(env).pop('markdown_timings', None)
+
+def timing_report(timings):
+    """Return the timing report of ``timings`` as a JSON-able dict.
+
+    Documents are sorted from the slowest to the fastest.
+    """
+    documents = sorted(
+        ({
+            'docname': docname,
+            'total': sum(durations.values()),
+            'phases': durations,
+        } for docname, durations in timings.items()),
+        key=lambda document: (-document['total'], document['docname'])
+    )
+    phases = {}
+    for durations in timings.values():
+        for phase, duration in durations.items():
+            phases[phase] = phases.get(phase, 0.0) + duration
+    return {
+        'total': sum(phases.values()),
+        'phases': phases,
+        'documents': documents,
+    }
+
+def format_timing_report(report, limit=REPORT_LIMIT):
+    """Format a timing report as text."""
+    total = report['total']
+    lines = [
+        'Markdown parse timings: %d documents, %.3fs' %
+        (len(report['documents']), total),
+        '',
+        'Totals per phase:',
+    ]
+    for phase, duration in sorted(
+        report['phases'].items(), key=lambda item: -item[1]
+    ):
+        lines.append('  %10.3fs %5.1f%%  %s' % (
+            duration, 100.0 * duration / total if total else 0.0, phase
+        ))
+    lines += ['', 'Slowest documents:']
+    for document in report['documents'][:limit]:
+        phases = ', '.join(
+            '%s %.3fs' % item for item in sorted(
+                document['phases'].items(), key=lambda item: -item[1]
+            )
+        )
+        lines.append('  %10.3fs  %s (%s)' % (
+            document['total'], document['docname'], phases
+        ))
+    return '\n'.join(lines) + '\n'
+
+def write_timing_report(app, exception):
+    """Write the timing report to the output directory."""
+    timings = getattr(app, '_markdown_timings', None)
+    if exception is not None or timings is None:
+        return
+    from sphinx.util import logging
+    logger = logging.getLogger(__name__)
+    report = timing_report(timings)
+    path = os.path.join(app.outdir, 'markdown_timings')
+    with io.open(path + '.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    with io.open(path + '.txt', 'w', encoding='utf-8') as f:
+        f.write(format_timing_report(report))
+    logger.info('markdown parse timings written to %s.txt', path)
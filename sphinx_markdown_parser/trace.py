@@ -0,0 +1,108 @@
+"""Export the stages of the markdown pipeline as trace spans.
+
+With the ``trace_file`` option, every ``markdown-parse-end`` and
+``markdown-transform-end`` event of a build is recorded as a span, and the
+spans are written to the trace file in the output directory at the end of
+the build: as JSON lines if its name ends with ``.jsonl``, in the Chrome
+trace event format otherwise, which trace viewers such as
+``chrome://tracing`` or Perfetto load. Spans are laid out per process, so
+the timeline of a parallel build shows when its read workers sat idle.
+"""
+
+import io
+import json
+import os
+
+from .config import get_build_config
+
+def init_trace(app):
+    """Start recording spans for this build if enabled.
+
+    The recorder only listens to the events when tracing, as the events
+    carry node counts only for someone listening.
+    """
+    if get_build_config(app)['trace_file']:
+        app.env.markdown_spans = {}
+        for stage in ('parse', 'transform'):
+            app.connect('markdown-%s-end' % stage, record_span)
+    else:
+        app.env.markdown_spans = None
+
+def record_span(app, docname, info):
+    """Record the span of a ``markdown-*-end`` event."""
+    spans = getattr(app.env, 'markdown_spans', None)
+    if spans is not None:
+        spans.setdefault(docname, []).append(
+            dict(info, docname=docname, pid=os.getpid())
+        )
+
+def purge_spans(app, env, docname):
+    spans = getattr(env, 'markdown_spans', None)
+    if spans is not None:
+        spans.pop(docname, None)
+
+def merge_spans(app, env, docnames, other):
+    """Merge the spans recorded by a parallel read worker."""
+    spans = getattr(env, 'markdown_spans', None)
+    other_spans = getattr(other, 'markdown_spans', None)
+    if spans is None or other_spans is None:
+        return
+    for docname in docnames:
+        if docname in other_spans:
+            spans[docname] = other_spans[docname]
+
+def collect_spans(app, env):
+    """Move the spans of the build from ``env`` to ``app``.
+
+    Connected to ``env-updated``: the spans travel with the environment of
+    the parallel read workers, but are not saved with the environment.
+    """
+    app._markdown_spans = vars(env).pop('markdown_spans', None)
+
+def sorted_spans(spans):
+    return sorted(
+        (span for doc_spans in spans.values() for span in doc_spans),
+        key=lambda span: (span['start'], span['pid'])
+    )
+
+def chrome_trace(spans):
+    """Return ``spans`` in the Chrome trace event format.
+
+    Times are in microseconds since the start of the first span.
+    """
+    spans = sorted_spans(spans)
+    origin = spans[0]['start'] if spans else 0.0
+    events = [{
+        'name': '%s %s' % (span['stage'], span['docname']),
+        'cat': 'markdown,' + span['stage'],
+        'ph': 'X',
+        'ts': (span['start'] - origin) * 1e6,
+        'dur': span['duration'] * 1e6,
+        'pid': span['pid'],
+        'tid': span['pid'],
+        'args': {
+            'docname': span['docname'],
+            'component': span['component'],
+            'size': span['size'],
+            'nodes': span['nodes'],
+            'phases': span['phases'],
+        },
+    } for span in spans]
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+def write_trace(app, exception):
+    """Write the recorded spans to the trace file."""
+    spans = getattr(app, '_markdown_spans', None)
+    if exception is not None or spans is None:
+        return
+    from sphinx.util import logging
+    logger = logging.getLogger(__name__)
+    path = os.path.join(app.outdir, get_build_config(app)['trace_file'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with io.open(path, 'w', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for span in sorted_spans(spans):
+                f.write(json.dumps(span, sort_keys=True) + '\n')
+        else:
+            json.dump(chrome_trace(spans), f)
+    logger.info('markdown parse trace written to %s', path)
@@ -1,15 +1,37 @@
 """Implement some common transforms on parsed AST."""
 
 import os
+import posixpath
 import re
+import time
 
 from docutils import nodes, transforms
-from docutils.parsers.rst import Parser
+from docutils.parsers.rst import directives, roles
 from docutils.statemachine import StringList
-from docutils.utils import new_document
+from docutils.utils import DependencyList
 from sphinx import addnodes
-
+from sphinx.directives.code import CodeBlock
+from sphinx.directives.patches import MathDirective
+from sphinx.util import docname_join, url_re
+from sphinx.util.nodes import explicit_title_re
+
+from .cache import content_hash, copy_nodes, get_cache
+from .config import DEFAULT_CONFIG, compile_config, get_config
+from .shared_cache import shared_get, shared_put
+from .source_index import get_source_index
 from .states import DummyStateMachine
+from .timing import instrument
+
+# settings that change how a reStructuredText fragment is parsed
+FINGERPRINT_SETTINGS = (
+    'character_level_inline_markup',
+    'file_insertion_enabled',
+    'language_code',
+    'pep_references',
+    'raw_enabled',
+    'rfc_references',
+    'tab_width',
+)
 
 class AutoStructify(transforms.Transform):
     """Automatically try to transform blocks to sphinx directives.
@@ -19,37 +41,16 @@ class AutoStructify(transforms.Transform):
     def __init__(self, *args, **kwargs):
         transforms.Transform.__init__(self, *args, **kwargs)
         self.reporter = self.document.reporter
-        self.config = self.default_config.copy()
-        try:
-            new_cfg = self.document.settings.env.config.markdown_parser_config
-            self.config.update(new_cfg)
-        except AttributeError:
-            pass
-
-        # Deprecation notices
-        # TODO move this check to an extension pattern, and only call once
-        if self.config.get('enable_auto_doc_ref', False):
-            self.reporter.warning(
-                'AutoStructify option "enable_auto_doc_ref" is deprecated'
-            )
+        # compiled once per build, deprecation notices are logged then
+        self.config = get_config(self.document.settings)
+        if self.config is None:
+            self.config = compile_config(self.default_config)
 
     # set to a high priority so it can be applied first for markdown docs
     default_priority = 1
     suffix_set = set(['md', 'rst'])
 
-    default_config = {
-        'auto_toc_tree_maxdepth': 1,
-        'auto_toc_tree_numbered': None,
-        'auto_toc_tree_section': None,
-        'commonmark_suffixes': ['.md'],
-        'enable_auto_doc_ref': False,
-        'enable_auto_toc_tree': True,
-        'enable_eval_rst': True,
-        'enable_inline_math': True,
-        'enable_math': True,
-        'parser': 'CommonMark',
-        'url_resolver': lambda x: x,
-    }
+    default_config = DEFAULT_CONFIG
 
     def parse_ref(self, ref):
         """Analyze the ref block, and return the information needed.
@@ -83,16 +84,18 @@ class AutoStructify(transforms.Transform):
             return (title, uri, None)
         uri = arr[0]
 
-        abspath = os.path.abspath(os.path.join(self.file_dir, uri))
+        abspath = os.path.normpath(os.path.join(self.file_dir, uri))
         relpath = os.path.relpath(abspath, self.root_dir)
         suffix = abspath.rsplit('.', 1)
         if len(suffix) == 2 and suffix[1] in AutoStructify.suffix_set and (
-            os.path.exists(abspath) and abspath.startswith(self.root_dir)
+            abspath.startswith(self.root_dir)
+            and self.source_index.exists(abspath)
         ):
             # replace the path separator if running on non-UNIX environment
             if os.path.sep != '/':
                 relpath = relpath.replace(os.path.sep, '/')
             docpath = '/' + relpath.rsplit('.', 1)[0]
+            self.document.settings.env.note_dependency(abspath)
             # rewrite suffix to html, this is suboptimal
             uri = docpath + '.html'
             if anchor is None:
@@ -100,9 +103,12 @@ class AutoStructify(transforms.Transform):
             else:
                 return (title, uri + '#' + anchor, None)
         else:
-            # use url resolver
+            # use url resolver, which is memoized for the build
             if self.url_resolver:
-                uri = self.url_resolver(relpath)
+                uri = self.resolved_urls.get(relpath)
+                if uri is None:
+                    uri = self.url_resolver(relpath)
+                    self.resolved_urls.put(relpath, uri)
             if anchor:
                 uri += '#' + anchor
             return (title, uri, None)
@@ -189,9 +195,12 @@ class AutoStructify(transforms.Transform):
                 refs.append((title, docpath))
             else:
                 refs.append((title, uri))
-        self.state_machine.reset(
-            self.document, node.parent, self.current_level
+        self.state_machine.set_parent(node.parent, self.current_level)
+        toctree = self.make_toctree(
+            [v for _, v in refs], sec, maxdepth, numbered
         )
+        if toctree is not None:
+            return toctree
         return self.state_machine.run_directive(
             'toctree',
             options={
@@ -202,6 +211,64 @@ class AutoStructify(transforms.Transform):
             content=[v for _, v in refs]
         )
 
+    def make_toctree(self, content, caption, maxdepth, numbered):
+        """Build the nodes of a toctree directive without running it.
+
+        The entries are resolved against the environment's ``found_docs``
+        in one pass. Entries that need the directive's diagnostics
+        (explicit titles, missing, excluded or duplicated documents) make
+        this return None so that the caller falls back to the directive.
+
+        Parameters
+        ----------
+        content : list of str
+            The toctree entries.
+        caption : str
+            The caption option of the toctree.
+        maxdepth : int
+            The maxdepth option of the toctree.
+        numbered : int
+            The numbered option of the toctree.
+
+        Returns
+        -------
+        nodes : list of docutils node
+            The nodes the toctree directive produces, or None.
+        """
+        env = self.document.settings.env
+        suffixes = tuple(env.config.source_suffix)
+        entries = []
+        includefiles = []
+        for entry in content:
+            if not entry:
+                continue
+            if explicit_title_re.match(entry):
+                return None
+            if url_re.match(entry) or entry == 'self':
+                entries.append((None, entry))
+                continue
+            docname = entry
+            # remove suffixes (backwards compatibility)
+            for suffix in suffixes:
+                if docname.endswith(suffix):
+                    docname = docname[:-len(suffix)]
+                    break
+            docname = docname_join(env.docname, docname)
+            entries.append((None, docname))
+            includefiles.append(docname)
+        resolved = set(includefiles)
+        if len(resolved) != len(includefiles) or env.docname in resolved or (
+            not resolved.issubset(env.found_docs)
+        ):
+            return None
+
+        lineno = self.state_machine.node.line
+        source, line = self.state_machine.get_source_and_line(lineno)
+        return [new_toctree(
+            env.docname, entries, includefiles, caption, maxdepth, numbered,
+            source, line
+        )]
+
     def auto_inline_code(self, node):
         """Try to automatically generate nodes for inline literals.
 
@@ -225,12 +292,15 @@ class AutoStructify(transforms.Transform):
             if not self.config['enable_inline_math']:
                 return None
             content = content[1:-1]
-            self.state_machine.reset(
-                self.document, node.parent, self.current_level
-            )
+            self.state_machine.set_parent(node.parent, self.current_level)
             # In sphinx 1.8+, the parser has migrated to docutils math role,
             # which expects containing "`" in the rst file.
             content = '`%s`' % content
+            if self.is_builtin('role', 'math', roles.math_role):
+                return self.cached_node(
+                    ('math', content),
+                    lambda: nodes.math(content, content.split('`')[1])
+                )
             return self.state_machine.run_role('math', content=content)
         else:
             return None
@@ -251,43 +321,283 @@ class AutoStructify(transforms.Transform):
         original_node = node
         if 'language' not in node:
             return None
-        self.state_machine.reset(
-            self.document, node.parent, self.current_level
-        )
+        self.state_machine.set_parent(node.parent, self.current_level)
         # content = node.rawsource.split('\n')
         content = ''.join([child.astext()
                            for child in node.children]).split('\n')
         language = node['language']
         if language == 'math':
             if self.config['enable_math']:
+                if self.is_builtin('directive', 'math', MathDirective) and (
+                    not self.document.settings.env.config.math_number_all
+                ):
+                    return [self.make_math_block(content)]
                 return self.state_machine.run_directive(
                     'math', content=content
                 )
-        elif language == 'eval_rst':
+        elif language.split()[0] == 'eval_rst':
             if self.config['enable_eval_rst']:
-                # allow embed non section level rst
-                node = nodes.section()
-                self.state_machine.state.nested_parse(
-                    StringList(content, source=original_node.source),
-                    0,
-                    node=node,
-                    match_titles=True
-                )
-                return node.children[:]
+                # "eval_rst nocache" opts a block out of the fragment cache
+                if 'nocache' in language.split()[1:]:
+                    return self.parse_rst(content, original_node.source)
+                return self.parse_cached_rst(content, original_node.source)
         else:
             match = re.search(r'[ ]?[\w_-]+::.*', language)
             if match:
-                parser = Parser()
-                new_doc = new_document(None, self.document.settings)
                 newsource = u'.. ' + match.group(0) + '\n' + node.rawsource
-                parser.parse(newsource, new_doc)
-                return new_doc.children[:]
+                return self.parse_rst(
+                    newsource.split('\n'), original_node.source
+                )
+            elif self.is_builtin('directive', 'code-block', CodeBlock):
+                return [self.make_code_block(language, content)]
             else:
                 return self.state_machine.run_directive(
                     'code-block', arguments=[language], content=content
                 )
         return None
 
+    def is_builtin(self, kind, name, builtin):
+        """Check that a role or directive is the one nodes are built for.
+
+        The lookup is done once per document; when a project overrides the
+        role or directive, nodes are generated by running it instead.
+
+        Parameters
+        ----------
+        kind : str
+            Either 'role' or 'directive'.
+        name : str
+            Name of the role or directive.
+        builtin : function or class
+            The implementation the direct node construction mirrors.
+        """
+        key = (kind, name)
+        if key not in self.builtins:
+            language = self.state_machine.language
+            if kind == 'role':
+                impl, _ = roles.role(name, language, 0, self.reporter)
+            else:
+                impl, _ = directives.directive(name, language, self.document)
+            self.builtins[key] = impl is builtin
+        return self.builtins[key]
+
+    def cached_node(self, key, factory):
+        """Return a copy of the node built by ``factory`` for ``key``.
+
+        Nodes are kept in a per-build cache, so identical formulas and
+        code blocks are only built once.
+        """
+        cache = get_cache(
+            self.document.settings.env, 'nodes',
+            self.config['node_cache_size']
+        )
+        node = cache.get(key)
+        if node is None:
+            node = factory()
+            cache.put(key, node)
+        return copy_nodes([node], self.document)[0]
+
+    def set_source_info(self, node):
+        """Set the source info the way a directive at the parent would."""
+        lineno = self.state_machine.node.line
+        node.source, node.line = \
+            self.state_machine.get_source_and_line(lineno)
+
+    def make_math_block(self, content):
+        """Build the node of a math directive without options.
+
+        Parameters
+        ----------
+        content : list of str
+            Lines of the formula.
+        """
+        latex = '\n'.join(content)
+        node = self.cached_node(
+            ('math_block', latex),
+            lambda: nodes.math_block(
+                latex, latex, classes=[], docname=None, number=None,
+                label=None, nowrap=False
+            )
+        )
+        node['docname'] = self.document.settings.env.docname
+        self.set_source_info(node)
+        return node
+
+    def make_code_block(self, language, content):
+        """Build the node of a code-block directive without options.
+
+        Parameters
+        ----------
+        language : str
+            Highlight language of the code.
+        content : list of str
+            Lines of code.
+        """
+        code = '\n'.join(content)
+
+        def factory():
+            literal = nodes.literal_block(code, code)
+            literal['force'] = False
+            literal['language'] = language
+            literal['highlight_args'] = {}
+            return literal
+
+        node = self.cached_node(('code-block', language, code), factory)
+        self.set_source_info(node)
+        return node
+
+    def parse_rst(self, content, source):
+        """Parse reStructuredText lines into the current document.
+
+        The nested state machine of ``self.state_machine`` is reused for
+        every fragment of the document, so no new parser or document is
+        created per block.
+
+        Parameters
+        ----------
+        content : list of str
+            Lines of reStructuredText.
+        source : str
+            Source path reported for the parsed lines.
+
+        Returns
+        -------
+        nodes : list of docutils node
+            The parsed nodes.
+        """
+        # allow embed non section level rst
+        node = nodes.section()
+        self.state_machine.state.nested_parse(
+            StringList(content, source=source),
+            0,
+            node=node,
+            match_titles=True
+        )
+        return node.children[:]
+
+    def settings_fingerprint(self):
+        """Return the parse context that an eval_rst fragment depends on.
+
+        Relative paths of directives such as ``include`` resolve against
+        the directory of the document, which is part of the context.
+        """
+        settings = self.document.settings
+        env = settings.env
+        temp_data = env.temp_data
+        default_domain = temp_data.get('default_domain')
+        return (
+            posixpath.dirname(env.docname),
+            tuple(getattr(settings, name, None)
+                  for name in FINGERPRINT_SETTINGS),
+            temp_data.get('highlight_language'),
+            temp_data.get('default_role'),
+            getattr(default_domain, 'name', None),
+            self.current_level,
+        )
+
+    def parse_cached_rst(self, content, source):
+        """Parse reStructuredText lines, reusing results of equal fragments.
+
+        Results are cached per build by content hash and settings
+        fingerprint, which includes the directory of the document, together
+        with the dependencies and included documents recorded while
+        parsing. Fragments whose output depends on the document they are
+        parsed in are never cached, see `is_context_free`. Results missing
+        from the cache are looked up in the cache shared by the workers of
+        a parallel build, if there is one.
+
+        Parameters
+        ----------
+        content : list of str
+            Lines of reStructuredText.
+        source : str
+            Source path reported for the parsed lines.
+
+        Returns
+        -------
+        nodes : list of docutils node
+            The parsed nodes.
+        """
+        cache = get_cache(
+            self.document.settings.env, 'eval_rst',
+            self.config['eval_rst_cache_size']
+        )
+        if cache.maxsize == 0:
+            return self.parse_rst(content, source)
+        key = (content_hash('\n'.join(content)), self.settings_fingerprint())
+        settings = self.document.settings
+        env = settings.env
+        cached = cache.get(key)
+        if cached is None:
+            cached = shared_get(env, ('eval_rst',) + key)
+            if cached is not None:
+                cache.put(key, cached)
+        if cached is not None:
+            cached_nodes, dependencies, noted, included = cached
+            settings.record_dependencies.add(*dependencies)
+            env.dependencies[env.docname].update(noted)
+            env.included[env.docname].update(included)
+            return copy_nodes(cached_nodes, self.document, source)
+        side_effects = self.side_effects()
+        # collect the files the fragment depends on (e.g. through include or
+        # literalinclude) and the documents it includes, so that they are
+        # recorded again when the result is reused; the key holds the
+        # directory of the document, which relative paths resolve against
+        record_dependencies = settings.record_dependencies
+        settings.record_dependencies = DependencyList()
+        env_dependencies = env.dependencies[env.docname]
+        env_included = env.included[env.docname]
+        env.dependencies[env.docname] = set()
+        env.included[env.docname] = set()
+        start = time.perf_counter()
+        try:
+            result = self.parse_rst(content, source)
+        finally:
+            dependencies = tuple(settings.record_dependencies.list)
+            noted = tuple(env.dependencies[env.docname])
+            included = tuple(env.included[env.docname])
+            settings.record_dependencies = record_dependencies
+            env.dependencies[env.docname] = env_dependencies
+            env.included[env.docname] = env_included
+        cost = time.perf_counter() - start
+        record_dependencies.add(*dependencies)
+        env_dependencies.update(noted)
+        env_included.update(included)
+        if side_effects == self.side_effects() and self.is_context_free(
+            result
+        ):
+            cached = (copy_nodes(result), dependencies, noted, included)
+            cache.put(key, cached)
+            shared_put(env, ('eval_rst',) + key, cached, cost)
+        return result
+
+    def side_effects(self):
+        """Snapshot the document and environment state a parse can touch."""
+        return (
+            len(self.document.transformer.transforms),
+            dict(self.document.settings.env.temp_data),
+        )
+
+    @staticmethod
+    def is_context_free(node_list):
+        """Check that parsed nodes can be reused in any other document.
+
+        Nodes registering names or references in the document, sphinx
+        specific nodes (which refer to the current document) and
+        system messages all tie a parse result to its document.
+        """
+        for node in node_list:
+            for child in node.traverse(nodes.Element):
+                if isinstance(child, (nodes.system_message, nodes.pending)):
+                    return False
+                if child.__module__ == addnodes.__name__:
+                    return False
+                for name in ('ids', 'names', 'refname', 'refid', 'docname',
+                             'refdoc'):
+                    if child.get(name):
+                        return False
+        return True
+
     def find_replace(self, node):
         """Try to find replace node for current node.
 
@@ -339,21 +649,89 @@ class AutoStructify(transforms.Transform):
 
     def apply(self):
         """Apply the transformation by configuration."""
+        # the transform may be registered both globally and by the parser
+        for _, transform_class, _, _ in self.document.transformer.applied:
+            if issubclass(transform_class, AutoStructify):
+                return
+
         source = self.document['source']
 
         self.reporter.info('AutoStructify: %s' % source)
 
         # only transform markdowns
-        if not source.endswith(tuple(self.config['commonmark_suffixes'])):
+        if not source.endswith(self.config['commonmark_suffixes']):
             return
 
         self.url_resolver = self.config['url_resolver']
         assert callable(self.url_resolver)
 
+        self.builtins = {}
         self.state_machine = DummyStateMachine()
+        self.state_machine.bind_document(self.document)
         self.current_level = 0
         self.file_dir = os.path.abspath(
             os.path.dirname(self.document['source'])
         )
-        self.root_dir = os.path.abspath(self.document.settings.env.srcdir)
-        self.traverse(self.document)
+        env = self.document.settings.env
+        self.root_dir = os.path.abspath(env.srcdir)
+        self.source_index = get_source_index(env)
+        self.resolved_urls = get_cache(env, 'url_resolver', None)
+        with instrument(self.document, 'transform',
+                        type(self).__name__) as timer:
+            with timer.phase('autostructify'):
+                self.traverse(self.document)
+
+
+def new_toctree(docname, entries, includefiles, caption, maxdepth,
+                numbered, source=None, line=None):
+    """Build the nodes of a toctree directive of ``docname``.
+
+    Parameters
+    ----------
+    docname : str
+        The document containing the toctree.
+    entries : list of (str, str)
+        The (title, docname or uri) entries of the toctree.
+    includefiles : list of str
+        The docnames of the entries.
+    caption : str
+        The caption option of the toctree.
+    maxdepth : int
+        The maxdepth option of the toctree.
+    numbered : int
+        The numbered option of the toctree.
+    source, line : str, int
+        Where the toctree was defined.
+
+    Returns
+    -------
+    wrapper : nodes.compound
+        The toctree node wrapped the way the directive wraps it.
+    """
+    toctree = addnodes.toctree()
+    toctree['parent'] = docname
+    toctree['entries'] = entries
+    toctree['includefiles'] = includefiles
+    toctree['maxdepth'] = maxdepth
+    toctree['caption'] = caption
+    toctree['glob'] = False
+    toctree['hidden'] = False
+    toctree['includehidden'] = False
+    toctree['numbered'] = numbered
+    toctree['titlesonly'] = False
+    toctree.source, toctree.line = source, line
+    wrapper = nodes.compound(classes=['toctree-wrapper'])
+    wrapper.append(toctree)
+    return wrapper
+
+def markdown_transforms(document):
+    """Return the transforms the markdown parsers add for ``document``.
+
+    AutoStructify is returned when ``enable_auto_structify`` is set, so that
+    it only runs for documents read by a markdown parser instead of being
+    registered globally with ``app.add_transform``.
+    """
+    config = get_config(document.settings)
+    if config is not None and config['enable_auto_structify']:
+        return [AutoStructify]
+    return []
@@ -0,0 +1,171 @@
+"""Fill the parse cache of a Sphinx project ahead of a build.
+
+Sphinx reads documents in chunks of equal length, so a few very large
+markdown files keep one worker busy long after the others are done.
+Parsing every markdown file beforehand with a process pool, largest
+first, moves that work out of the read phase: the parsers then load the
+cached doctrees instead of parsing (see ``parse_cache_dir``).
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+from docutils.frontend import OptionParser
+from docutils.io import FileInput
+from docutils.utils import new_document
+
+from .commonmark_parser import CommonMarkParser
+from .config import get_build_config
+from .markdown_parser import MarkdownParser
+from .parse_cache import ParseCache, capture_parse
+
+MARKDOWN_PARSERS = (CommonMarkParser, MarkdownParser)
+
+# state shared with the forked worker processes
+_state = {}
+
+def find_markdown_documents(app):
+    """Return ``(docname, path, filetype)`` of the markdown documents.
+
+    Documents are ordered from the largest to the smallest file.
+    """
+    from sphinx.util import get_filetype
+    parsers = app.registry.get_source_parsers()
+    documents = []
+    for docname in sorted(app.env.found_docs):
+        path = app.env.doc2path(docname)
+        filetype = get_filetype(app.config.source_suffix, path)
+        parser_class = parsers.get(filetype)
+        if parser_class and issubclass(parser_class, MARKDOWN_PARSERS):
+            documents.append((os.path.getsize(path), docname, path, filetype))
+    documents.sort(key=lambda document: (-document[0], document[1]))
+    return [document[1:] for document in documents]
+
+def warm_document(document):
+    """Parse one document into the cache and return its status."""
+    docname, path, filetype = document
+    app, cache = _state['app'], _state['cache']
+    env = app.env
+    try:
+        env.prepare_settings(docname)
+        source = FileInput(
+            source_path=path, encoding=app.config.source_encoding
+        )
+        arg = [source.read()]
+        app.events.emit('source-read', docname, arg)
+        text = arg[0]
+        parser = app.registry.create_source_parser(app, filetype)
+        settings = OptionParser(
+            components=(parser,), defaults=env.settings
+        ).get_default_values()
+        settings.env = env
+        settings.warning_stream = io.StringIO()
+        document = new_document(path, settings)
+        key = cache.key(parser, document['source'], text,
+                        get_build_config(app))
+        if key in cache:
+            return docname, 'cached'
+        messages = []
+        document.reporter.attach_observer(messages.append)
+        document.markdown_links = []
+        parser.parse(text, document)
+        if messages:
+            # messages are reported when Sphinx parses the document itself
+            return docname, 'skipped'
+        cache.store(key, capture_parse(document))
+        return docname, 'stored'
+    except Exception as exc:
+        return docname, 'failed: %s' % exc
+
+def warm_up(app, cache, jobs=None, status=None):
+    """Parse the markdown documents of ``app`` into ``cache``.
+
+    Returns a dict mapping docnames to their status: ``stored``,
+    ``cached`` when already in the cache, ``skipped`` when parsing
+    reported messages, or ``failed: <error>``.
+    """
+    documents = find_markdown_documents(app)
+    _state.update(app=app, cache=cache)
+    results = {}
+    try:
+        if jobs == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            outcomes = map(warm_document, documents)
+            pool = None
+        else:
+            pool = multiprocessing.get_context('fork').Pool(jobs)
+            outcomes = pool.imap_unordered(warm_document, documents)
+        for count, (docname, outcome) in enumerate(outcomes, 1):
+            results[docname] = outcome
+            if status is not None:
+                status.write('[%d/%d] %s: %s\n' %
+                             (count, len(documents), docname, outcome))
+        if pool is not None:
+            pool.close()
+            pool.join()
+    finally:
+        _state.clear()
+    return results
+
+def main(argv=None):
+    from sphinx.application import Sphinx
+    argparser = argparse.ArgumentParser(
+        description='Parse the markdown documents of a Sphinx project into '
+        'the cache set by the "parse_cache_dir" option of '
+        'markdown_parser_config, so that the build loads them instead.'
+    )
+    argparser.add_argument('sourcedir', help='Sphinx source directory')
+    argparser.add_argument(
+        '-c', dest='confdir',
+        help='directory of conf.py (default: the source directory)'
+    )
+    argparser.add_argument(
+        '-j', dest='jobs', type=int, default=None,
+        help='number of processes (default: number of CPUs)'
+    )
+    argparser.add_argument(
+        '-d', '--cache-dir', dest='cache_dir',
+        help='cache directory (default: "parse_cache_dir" of the project)'
+    )
+    argparser.add_argument(
+        '-q', dest='quiet', action='store_true',
+        help='only report failures'
+    )
+    args = argparser.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        app = Sphinx(
+            srcdir=args.sourcedir,
+            confdir=args.confdir or args.sourcedir,
+            outdir=tmpdir,
+            doctreedir=tmpdir,
+            buildername='dummy',
+            status=None,
+            warning=sys.stderr,
+            freshenv=True,
+        )
+        cache_dir = args.cache_dir
+        if cache_dir is None:
+            cache_dir = get_build_config(app)['parse_cache_dir']
+            if not cache_dir:
+                argparser.error('no --cache-dir given and no '
+                                '"parse_cache_dir" in markdown_parser_config')
+            cache_dir = os.path.join(app.confdir, cache_dir)
+        results = warm_up(
+            app, ParseCache(cache_dir), args.jobs,
+            None if args.quiet else sys.stdout
+        )
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    failed = sorted(
+        docname for docname, outcome in results.items()
+        if outcome.startswith('failed')
+    )
+    for docname in failed:
+        sys.stderr.write('%s: %s\n' % (docname, results[docname]))
+    return 1 if failed else 0
@@ -0,0 +1,92 @@
+"""Reconvert markdown files whenever their content changes.
+
+The sources are polled, which needs nothing beyond the standard library:
+files whose size and modification time are unchanged are skipped, the
+others are hashed and reconverted when their content changed. The
+`Converter` is created once and stays warm between rebuilds.
+"""
+
+import os
+import time
+
+from .convert import convert_batch
+from .outdated import file_hash
+
+class SourceWatcher:
+    """Tell which sources changed since they were last seen.
+
+    Parameters
+    ----------
+    discover : callable
+        Returns the ``(source, destination)`` pairs to watch; called on
+        every poll, so new files of watched directories are picked up.
+    """
+    def __init__(self, discover):
+        self.discover = discover
+        # source -> ((size, mtime), content hash)
+        self.seen = {}
+
+    def changed(self):
+        """Return the pairs whose source content changed, or is new."""
+        changed = []
+        seen = {}
+        for source, destination in self.discover():
+            try:
+                stat = os.stat(source)
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            previous = self.seen.get(source)
+            if previous is not None and previous[0] == signature:
+                seen[source] = previous
+                continue
+            digest = file_hash(source)
+            if digest is None:
+                continue
+            seen[source] = (signature, digest)
+            if previous is None or previous[1] != digest:
+                changed.append((source, destination))
+        self.seen = seen
+        return changed
+
+def watch(converter, discover, interval=1.0, processes=None, stream=None,
+          stop=None):
+    """Convert the sources of ``discover`` and reconvert them on change.
+
+    Every rebuild and its latency, from the poll noticing the change to
+    the last file written, are reported to ``stream``, if given.
+
+    Parameters
+    ----------
+    converter : Converter
+        The converter kept for all rebuilds.
+    discover : callable
+        Returns the ``(source, destination)`` pairs to convert.
+    interval : float
+        Seconds between two polls.
+    processes : int
+        Number of processes converting the files of a rebuild.
+    stream : file
+        Stream to report progress to.
+    stop : callable
+        Called after every poll; watching stops when it returns true.
+        Without it, watching goes on until interrupted.
+    """
+    watcher = SourceWatcher(discover)
+    while True:
+        start = time.perf_counter()
+        jobs = watcher.changed()
+        if jobs:
+            failures = convert_batch(converter, jobs, processes, stream)
+            if stream is not None:
+                stream.write(
+                    'rebuilt %d file%s in %.0f ms%s\n' % (
+                        len(jobs), '' if len(jobs) == 1 else 's',
+                        (time.perf_counter() - start) * 1000,
+                        ', %d failed' % failures if failures else ''
+                    )
+                )
+                stream.flush()
+        if stop is not None and stop():
+            return
+        time.sleep(interval)
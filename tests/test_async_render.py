@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import mock
+
+from sphinx_markdown_parser import async_render
+from sphinx_markdown_parser.async_render import AsyncRenderer
+from sphinx_markdown_parser.render import render_html_body, render_parts
+
+
+class SlowRender:
+    """Stand-in for render_parts counting its calls."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, text, *args):
+        with self.lock:
+            self.calls.append(text)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        return {'body': text}
+
+
+class TestAsyncRender(unittest.TestCase):
+
+    def patch(self, delay):
+        render = SlowRender(delay)
+        patcher = mock.patch.object(async_render, 'render_parts', render)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return render
+
+    def test_render(self):
+        async def main():
+            async with AsyncRenderer() as renderer:
+                body = await renderer.render_html_body('# Title\n\n*x*')
+                parts = await renderer.render_parts('*x*', 'pseudoxml')
+            return body, parts
+
+        body, parts = asyncio.run(main())
+        self.assertEqual(body, render_html_body('# Title\n\n*x*'))
+        self.assertEqual(parts, render_parts('*x*', 'pseudoxml'))
+
+    def test_process_executor(self):
+        async def main():
+            with ProcessPoolExecutor(2) as executor:
+                renderer = AsyncRenderer(executor)
+                return await asyncio.gather(*(
+                    renderer.render_html_body('*%d*' % i) for i in range(4)
+                ))
+
+        self.assertEqual(
+            asyncio.run(main()), ['<p><em>%d</em></p>\n' % i for i in range(4)]
+        )
+
+    def test_coalescing(self):
+        render = self.patch(0.1)
+
+        async def main():
+            async with AsyncRenderer() as renderer:
+                results = await asyncio.gather(*(
+                    renderer.render_parts('same') for _ in range(5)
+                ))
+                self.assertEqual(renderer.in_flight, {})
+                results.append(await renderer.render_parts('same'))
+            return results
+
+        results = asyncio.run(main())
+        self.assertEqual(results, [{'body': 'same'}] * 6)
+        self.assertIsNot(results[0], results[1])
+        self.assertEqual(render.calls, ['same', 'same'])
+
+    def test_bounded_concurrency(self):
+        render = self.patch(0.05)
+
+        async def main():
+            async with AsyncRenderer(max_concurrency=2) as renderer:
+                await asyncio.gather(*(
+                    renderer.render_parts(str(i)) for i in range(6)
+                ))
+
+        asyncio.run(main())
+        self.assertEqual(len(render.calls), 6)
+        self.assertEqual(render.max_running, 2)
+
+    def test_timeout_and_cancellation(self):
+        render = self.patch(0.2)
+
+        async def main():
+            async with AsyncRenderer(max_concurrency=1,
+                                     timeout=0.05) as renderer:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await renderer.render_parts('slow')
+                # waiting for the slot of the render that timed out
+                queued = asyncio.ensure_future(
+                    renderer.render_parts('queued', timeout=None)
+                )
+                await asyncio.sleep(0.01)
+                queued.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await queued
+                # let the cancelled renders finish
+                await asyncio.sleep(0.01)
+                self.assertEqual(renderer.in_flight, {})
+                return await renderer.render_parts('last', timeout=1)
+
+        self.assertEqual(asyncio.run(main()), {'body': 'last'})
+        self.assertEqual(render.calls, ['slow', 'last'])
+
+    def test_timed_out_renders_keep_their_slot(self):
+        render = self.patch(0.1)
+
+        async def main():
+            with ThreadPoolExecutor(4) as executor:
+                renderer = AsyncRenderer(executor, max_concurrency=1,
+                                         timeout=0.02)
+                for text in ('a', 'b', 'c'):
+                    with self.assertRaises(asyncio.TimeoutError):
+                        await renderer.render_parts(text)
+                return await renderer.render_parts('last', timeout=1)
+
+        self.assertEqual(asyncio.run(main()), {'body': 'last'})
+        self.assertEqual(render.max_running, 1)
+        self.assertEqual(render.calls, ['a', 'last'])
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from sphinx_markdown_parser.config import (
+    DEFAULT_CONFIG, compile_config, deprecation_warnings
+)
+
+
+class TestCompileConfig(unittest.TestCase):
+
+    def test_layers(self):
+        config = compile_config(
+            DEFAULT_CONFIG, None, {'enable_math': False},
+            {'commonmark_suffixes': '.markdown'}
+        )
+        self.assertFalse(config['enable_math'])
+        self.assertEqual(config['commonmark_suffixes'], ('.markdown',))
+        self.assertEqual(config['extensions'], ())
+        self.assertTrue(DEFAULT_CONFIG['enable_math'])
+
+    def test_frozen(self):
+        config = compile_config(DEFAULT_CONFIG)
+        with self.assertRaises(TypeError):
+            config['enable_math'] = False
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            compile_config(DEFAULT_CONFIG, {'url_resolver': 'http://'})
+        with self.assertRaises(ValueError):
+            compile_config(DEFAULT_CONFIG, {'eval_rst_cache_size': -1})
+        for split_dir in ('', '.', '../parts', '/tmp/parts'):
+            with self.assertRaises(ValueError):
+                compile_config(DEFAULT_CONFIG, {'split_dir': split_dir})
+        with self.assertRaises(ValueError):
+            compile_config(DEFAULT_CONFIG, {'split_heading_level': 7})
+        with self.assertRaises(ValueError):
+            compile_config(DEFAULT_CONFIG, {'shared_cache_max_bytes': 0})
+
+    def test_deprecation_warnings(self):
+        self.assertEqual(
+            deprecation_warnings(compile_config(DEFAULT_CONFIG)), []
+        )
+        config = compile_config(DEFAULT_CONFIG, {'enable_auto_doc_ref': True})
+        self.assertEqual(len(deprecation_warnings(config)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from sphinx_markdown_parser.convert import (
+    Converter, convert_formats, find_sources, formats_main, main
+)
+from sphinx_markdown_parser.watch import watch
+
+
+class TestConvert(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.write('src', 'index.md', '# Index\n\nSome *text*.\n')
+        self.write('src', 'sub', 'page.md', '# Page\n\n[home](../index.md)\n')
+        self.write('src', 'notes.txt', 'not markdown')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def write(self, *parts):
+        path = self.path(*parts[:-1])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with io.open(path, 'w') as f:
+            f.write(parts[-1])
+
+    def read(self, *parts):
+        with io.open(self.path(*parts)) as f:
+            return f.read()
+
+    def run_main(self, *argv):
+        stderr = io.StringIO()
+        with mock.patch('sys.stderr', stderr):
+            status = main('html', 'test', list(argv))
+        return status, stderr.getvalue()
+
+    def test_cli_imports(self):
+        code = (
+            'import sys\n'
+            'from sphinx_markdown_parser import scripts\n'
+            'sys.argv = ["md2html", sys.argv[1], sys.argv[2]]\n'
+            'try:\n'
+            '    scripts.md2html()\n'
+            'finally:\n'
+            '    print(sorted({"commonmark", "sphinx", "yaml"} &'
+            ' {name.split(".")[0] for name in sys.modules}))\n'
+        )
+        output = subprocess.check_output([
+            sys.executable, '-c', code, self.path('src', 'sub', 'page.md'),
+            self.path('page.html')
+        ])
+        self.assertEqual(output.strip(), b'[]')
+        self.assertIn('href="../index.html">home</a>', self.read('page.html'))
+
+    def test_convert_string(self):
+        converter = Converter('html', {'output_encoding': 'unicode'})
+        for text in ('# One\n\nfirst', '# Two\n\nsecond'):
+            output = converter.convert_string(text)
+            self.assertIn('<h1 class="title">%s</h1>' % text[2:5], output)
+            self.assertIn(text.split()[-1], output)
+
+    def test_single_file(self):
+        status, _ = self.run_main(
+            '--quiet', self.path('src', 'index.md'), self.path('index.html')
+        )
+        self.assertEqual(status, 0)
+        self.assertIn('<em>text</em>', self.read('index.html'))
+
+    def test_batch_options_without_batch(self):
+        for argv, message in (
+            (['--jobs', '2'], '--jobs requires --output-dir'),
+            (['--watch-interval', '2'], '--watch-interval requires --watch'),
+        ):
+            stderr = io.StringIO()
+            with mock.patch('sys.stderr', stderr), \
+                    self.assertRaises(SystemExit):
+                main('html', 'test', argv + [
+                    self.path('src', 'index.md'), self.path('index.html')
+                ])
+            self.assertIn('error: ' + message, stderr.getvalue())
+        self.assertFalse(os.path.exists(self.path('index.html')))
+
+    def test_batch(self):
+        for jobs in ('1', '2'):
+            out = 'out%s' % jobs
+            status, progress = self.run_main(
+                '--output-dir', self.path(out), '--jobs', jobs,
+                self.path('src'), self.path('missing.md')
+            )
+            self.assertEqual(status, 1)
+            self.assertIn('<em>text</em>', self.read(out, 'index.html'))
+            self.assertIn('href="../index.html"',
+                          self.read(out, 'sub', 'page.html'))
+            self.assertFalse(os.path.exists(self.path(out, 'notes.html')))
+            lines = progress.splitlines()
+            self.assertEqual(len(lines), 3)
+            self.assertTrue(lines[0].startswith('[1/3] '))
+            self.assertTrue(lines[1].endswith(
+                self.path(out, 'sub', 'page.html')
+            ))
+            self.assertIn('missing.md: InputError', lines[2])
+
+    def test_batch_without_fork(self):
+        with mock.patch('multiprocessing.get_all_start_methods',
+                        return_value=['spawn']):
+            status, progress = self.run_main(
+                '--output-dir', self.path('out'), '--jobs', '2',
+                self.path('src')
+            )
+        self.assertEqual(status, 0)
+        self.assertEqual(len(progress.splitlines()), 2)
+        self.assertIn('<em>text</em>', self.read('out', 'index.html'))
+
+    def test_find_sources(self):
+        self.write('src', 'sub', 'other.markdown', '# Other\n')
+        self.write('a', 'page.md', '# A\n')
+        self.write('b', 'page.md', '# B\n')
+        sources = list(find_sources([
+            self.path('src'), self.path('a', 'page.md'),
+            self.path('b', 'page.md')
+        ]))
+        self.assertEqual(sources, [
+            (self.path('src', 'index.md'), 'index.md'),
+            (self.path('src', 'sub', 'other.markdown'),
+             os.path.join('sub', 'other.markdown')),
+            (self.path('src', 'sub', 'page.md'),
+             os.path.join('sub', 'page.md')),
+            (self.path('a', 'page.md'), os.path.join('a', 'page.md')),
+            (self.path('b', 'page.md'), os.path.join('b', 'page.md')),
+        ])
+        self.assertEqual(
+            list(find_sources([self.path('a', 'page.md')])),
+            [(self.path('a', 'page.md'), 'page.md')]
+        )
+
+    def test_formats(self):
+        source = self.path('src', 'index.md')
+        targets = [
+            ('html', self.path('index.html')),
+            ('latex', self.path('index.tex')),
+            ('pseudoxml', self.path('index.txt')),
+        ]
+        outputs = convert_formats(source, targets)
+        for (writer_name, destination), output in zip(targets, outputs):
+            expected = Converter(writer_name).convert(
+                source, self.path('expected')
+            )
+            self.assertEqual(output, expected, writer_name)
+            self.assertEqual(self.read(destination), self.read('expected'))
+
+    def test_formats_command(self):
+        stderr = io.StringIO()
+        with mock.patch('sys.stderr', stderr):
+            status = formats_main('test', [
+                '--no-doc-title', self.path('src', 'index.md'),
+                'pseudoxml:' + self.path('index.txt'),
+                'html:' + self.path('index.html'),
+            ])
+        self.assertEqual(status, 0)
+        self.assertIn('<section ids="index"', self.read('index.txt'))
+        self.assertIn('<em>text</em>', self.read('index.html'))
+
+    def test_watch(self):
+        converter = Converter('html')
+        jobs = [
+            (self.path('src', 'index.md'), self.path('out', 'index.html')),
+            (self.path('src', 'sub', 'page.md'), self.path('out', 'page.html')),
+        ]
+        polls = []
+
+        def stop():
+            polls.append(len(polls))
+            if len(polls) == 1:
+                # same content, new modification time: not converted again
+                os.utime(self.path('src', 'sub', 'page.md'), (0, 0))
+                os.remove(self.path('out', 'page.html'))
+                self.write('src', 'index.md', '# Index\n\nChanged.\n')
+            return len(polls) == 3
+
+        stream = io.StringIO()
+        watch(converter, lambda: jobs, 0, 1, stream, stop)
+        rebuilds = [
+            line for line in stream.getvalue().splitlines()
+            if line.startswith('rebuilt')
+        ]
+        self.assertEqual(len(rebuilds), 2)
+        self.assertTrue(rebuilds[0].startswith('rebuilt 2 files in '))
+        self.assertTrue(rebuilds[1].startswith('rebuilt 1 file in '))
+        self.assertIn('Changed.', self.read('out', 'index.html'))
+        self.assertFalse(os.path.exists(self.path('out', 'page.html')))
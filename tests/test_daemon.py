@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from sphinx_markdown_parser.client import (
+    DaemonError, convert, private_directory, request
+)
+from sphinx_markdown_parser.daemon import ConversionServer
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'daemon.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def start(self, idle_timeout=5):
+        server = ConversionServer(self.path, idle_timeout)
+        thread = threading.Thread(target=server.serve)
+        thread.start()
+        return server, thread
+
+    def test_convert(self):
+        server, thread = self.start()
+        try:
+            self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+            output, messages = convert(
+                '# Title\n\nSome *text*.', path=self.path, start=False
+            )
+            self.assertIn('<em>text</em>', output)
+            self.assertEqual(messages, '')
+            output, _ = convert(
+                '# Title\n\ntext', 'pseudoxml', {'doctitle_xform': False},
+                path=self.path, start=False
+            )
+            self.assertIn('<section ids="title"', output)
+            self.assertEqual(len(server.converters), 2)
+            with self.assertRaises(DaemonError):
+                convert('text', 'nowriter', path=self.path, start=False)
+        finally:
+            request(self.path, {'op': 'stop'})
+            thread.join()
+        self.assertFalse(os.path.exists(self.path))
+        with self.assertRaises(DaemonError):
+            convert('text', path=self.path, start=False)
+
+    def test_client_directory(self):
+        server = ConversionServer(self.path)
+        try:
+            project = os.path.join(self.root, 'project')
+            os.mkdir(project)
+            with open(os.path.join(project, 'docutils.conf'), 'w') as f:
+                f.write('[general]\ndoctitle_xform: false\n')
+            message = {
+                'op': 'convert', 'text': '# Title\n\ntext',
+                'writer': 'pseudoxml',
+            }
+            cwd = os.getcwd()
+            reply = server.dispatch(dict(message, cwd=project))
+            self.assertIn('<section ids="title"', reply['output'])
+            self.assertEqual(os.getcwd(), cwd)
+            reply = server.dispatch(dict(message, cwd=self.root))
+            self.assertNotIn('<section', reply['output'])
+        finally:
+            server.server_close()
+
+    def test_private_socket(self):
+        server = ConversionServer(self.path)
+        try:
+            os.chmod(self.path, 0o666)
+            with self.assertRaises(DaemonError):
+                request(self.path, {'op': 'ping'})
+            with self.assertRaises(DaemonError):
+                convert('text', path=self.path)
+        finally:
+            server.server_close()
+        os.unlink(self.path)
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.bind(self.path)
+            os.chmod(self.path, 0o600)
+            with self.assertRaises(ConnectionRefusedError):
+                request(self.path, {'op': 'ping'})
+
+    def test_private_directory(self):
+        path = os.path.join(self.root, 'private')
+        self.assertEqual(private_directory(path), path)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+        self.assertEqual(private_directory(path), path)
+        os.chmod(path, 0o755)
+        with self.assertRaises(DaemonError):
+            private_directory(path)
+
+    def test_idle_timeout(self):
+        _, thread = self.start(idle_timeout=0.1)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_client_imports(self):
+        code = (
+            'import sys\n'
+            'from sphinx_markdown_parser import client\n'
+            'print(sorted({"docutils", "markdown", "sphinx", "yaml"} &'
+            ' {name.split(".")[0] for name in sys.modules}))\n'
+        )
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(output.strip(), b'[]')
+
+    def test_start_daemon(self):
+        output, _ = convert(
+            '# Title\n\nstarted', path=self.path, idle_timeout=5
+        )
+        self.assertIn('started', output)
+        pid = request(self.path, {'op': 'ping'})['pid']
+        self.assertNotEqual(pid, os.getpid())
+        request(self.path, {'op': 'stop'})
+        deadline = time.monotonic() + 5
+        while os.path.exists(self.path) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertFalse(os.path.exists(self.path))
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from docutils.core import publish_parts
+
+from sphinx_markdown_parser.parser import CommonMarkParser, MarkdownParser
+from sphinx_markdown_parser.render import (
+    get_pool, get_settings, render_html_body, render_many, render_parts
+)
+
+TEXT = '# Title\n\nSome *text* and `code`.\n\n* one\n* two\n'
+
+
+class TestRender(unittest.TestCase):
+
+    def test_matches_publish_parts(self):
+        for parser_class in (MarkdownParser, CommonMarkParser):
+            expected = publish_parts(
+                TEXT, parser=parser_class(), writer_name='html',
+                settings_overrides={'output_encoding': 'unicode'}
+            )
+            parts = render_parts(TEXT, parser_class=parser_class)
+            self.assertEqual(parts, expected, parser_class)
+
+    def test_html_body(self):
+        body = render_html_body(TEXT)
+        self.assertTrue(body.startswith('<div class="section" id="title">'))
+        self.assertIn('<em>text</em>', body)
+        self.assertEqual(render_html_body('*x*'), '<p><em>x</em></p>\n')
+
+    def test_cached_settings(self):
+        settings = get_settings('pseudoxml', {'report_level': 4})
+        self.assertIs(get_settings('pseudoxml', {'report_level': 4}),
+                      settings)
+        self.assertIsNot(get_settings('pseudoxml'), settings)
+        self.assertEqual(settings.report_level, 4)
+        render_parts('*x*', 'pseudoxml', {'report_level': 4},
+                     source_path='x.md')
+        self.assertIsNone(settings._source)
+
+    def test_frozen_settings(self):
+        settings = get_settings()
+        with self.assertRaises(AttributeError):
+            settings.report_level = 1
+        self.assertIsInstance(settings.stylesheet_path, tuple)
+        shared = get_pool('html', None, None).settings
+        render_parts('![image](picture.png)')
+        self.assertEqual(shared.record_dependencies.list, [])
+        copy = settings.copy()
+        copy.stylesheet_path.append('extra.css')
+        self.assertNotIn('extra.css', shared.stylesheet_path)
+
+    def test_pooled_converters(self):
+        pool = get_pool('xml', None, None)
+        render_parts('one', 'xml')
+        converter = pool.idle[-1]
+        parts = render_parts('two', 'xml')
+        self.assertIn('two', parts['whole'])
+        self.assertIs(pool.idle[-1], converter)
+        self.assertEqual(len(pool.idle), 1)
+
+    def test_render_many(self):
+        texts = ['# Title %d\n\n*%d* and `%d`' % (i, i, i) for i in range(24)]
+        expected = [render_parts(text) for text in texts]
+        self.assertEqual(render_many(texts, max_workers=4), expected)
+        with ProcessPoolExecutor(2) as executor:
+            self.assertEqual(render_many(texts, executor=executor), expected)
+
+    def test_shared_parser_threads(self):
+        parser = MarkdownParser()
+        barrier = threading.Barrier(4)
+        results = {}
+
+        def publish(index):
+            barrier.wait()
+            for _ in range(10):
+                body = publish_parts(
+                    '*%d*' % index, parser=parser, writer_name='html',
+                    settings_overrides={'output_encoding': 'unicode'}
+                )['body']
+                self.assertIsNot(parser.document, None)
+                results.setdefault(index, set()).add(
+                    (body, parser.document.astext())
+                )
+
+        threads = [threading.Thread(target=publish, args=(index,))
+                   for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {
+            index: {('<p><em>%d</em></p>\n' % index, str(index))}
+            for index in range(4)
+        })
+        self.assertIsNone(parser.document)
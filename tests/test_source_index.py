@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sphinx_markdown_parser.source_index import SourceIndex
+
+
+class TestSourceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.root, 'sub'))
+        self.touch('index.md')
+        self.touch('sub', 'page.md')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def touch(self, *parts):
+        with open(os.path.join(self.root, *parts), 'w') as f:
+            f.write('')
+
+    def test_exists(self):
+        index = SourceIndex(self.root)
+        self.assertTrue(index.exists(os.path.join(self.root, 'index.md')))
+        self.assertTrue(index.exists(os.path.join(self.root, 'sub', 'page.md')))
+        self.assertFalse(index.exists(os.path.join(self.root, 'missing.md')))
+        self.assertFalse(
+            index.exists(os.path.join(self.root, 'missing', 'page.md'))
+        )
+
+    def test_refresh(self):
+        index = SourceIndex(self.root)
+        path = os.path.join(self.root, 'sub', 'new.md')
+        self.assertFalse(index.exists(path))
+        self.touch('sub', 'new.md')
+        # force a different directory mtime on coarse grained filesystems
+        stat = os.stat(os.path.dirname(path))
+        os.utime(os.path.dirname(path), ns=(
+            stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9
+        ))
+        self.assertFalse(index.exists(path))
+        index.refresh()
+        self.assertTrue(index.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,20 @@
 import io
+import json
 import os
+import pickle
 import shutil
+import tempfile
+import time
 import unittest
 from contextlib import contextmanager
+from unittest import mock
 
+from docutils import nodes
 from sphinx.application import Sphinx
 
+from sphinx_markdown_parser import split
+from sphinx_markdown_parser.transform import AutoStructify
+
 
 @contextmanager
 def sphinx_built_file(test_dir, test_file):
@@ -222,6 +231,17 @@ class CustomExtensionTests(SphinxIntegrationTests):
             output
             )
 
+    def test_eval_rst_cache(self):
+        output = self.read_file('index.html')
+        self.assertEqual(output.count('<th class="head"><p>abc</p></th>'), 2)
+        cache = self.app._markdown_caches['eval_rst']
+        self.assertEqual(cache.hits, 1)
+
+    def test_directive_code_block(self):
+        output = self.read_file('index.html')
+        self.assertIn('<p class="admonition-title">Note</p>', output)
+        self.assertIn('<p>A directive note</p>', output)
+
 
 class InlineMathTests(SphinxIntegrationTests):
     build_path = 'tests/sphinx_inline_math'
@@ -231,3 +251,777 @@ class InlineMathTests(SphinxIntegrationTests):
         self.assertIn('>\\( E = mc^2 \\)<', output)
         self.assertIn('>$$<', output)
         self.assertIn('>$<', output)
+
+
+class ParserTransformTests(SphinxIntegrationTests):
+    build_path = 'tests/sphinx_mixed'
+
+    def setUp(self):
+        with mock.patch.object(
+            AutoStructify, 'apply', autospec=True,
+            side_effect=AutoStructify.apply
+        ) as apply:
+            super(ParserTransformTests, self).setUp()
+        self.sources = [
+            os.path.basename(call[0][0].document['source'])
+            for call in apply.call_args_list
+        ]
+
+    def test_integration(self):
+        self.assertEqual(self.sources, ['page.md'])
+        self.assertIn('>\\( E = mc^2 \\)<', self.read_file('page.html'))
+        index = self.read_file('index.html')
+        self.assertIn('<span class="pre">mc^2</span>', index)
+        self.assertNotIn('\\( E = mc^2 \\)', index)
+
+
+def build_doctree(build_path, docname='index'):
+    """Build a project and return the doctree of ``docname``."""
+    app = Sphinx(
+        srcdir=build_path,
+        confdir=build_path,
+        outdir=os.path.join(build_path, '_build', 'text'),
+        doctreedir=os.path.join(build_path, '_build', '.doctrees'),
+        buildername='html',
+        verbosity=1,
+    )
+    try:
+        app.build(force_all=True)
+        doctree = app.env.get_doctree(docname)
+    finally:
+        shutil.rmtree(os.path.join(build_path, '_build'))
+    source_info = [
+        (node.source, node.line) for node in doctree.traverse(nodes.Element)
+    ]
+    return doctree.pformat(), source_info
+
+
+class AutoTocTreeTests(unittest.TestCase):
+
+    def test_matches_directive(self):
+        direct = build_doctree('tests/sphinx_auto_toc')
+        with mock.patch.object(
+            AutoStructify, 'make_toctree', return_value=None
+        ):
+            directive = build_doctree('tests/sphinx_auto_toc')
+        self.assertIn("includefiles=\"first sub/second\"", direct[0])
+        self.assertEqual(direct, directive)
+
+
+class DirectNodeTests(unittest.TestCase):
+
+    def test_matches_directive(self):
+        direct = build_doctree('tests/sphinx_inline_math')
+        with mock.patch.object(
+            AutoStructify, 'is_builtin', return_value=False
+        ):
+            directive = build_doctree('tests/sphinx_inline_math')
+        self.assertEqual(direct[0].count('<math>'), 2)
+        self.assertIn('<math_block', direct[0])
+        self.assertIn('<literal_block', direct[0])
+        self.assertEqual(direct, directive)
+
+
+PROJECT_CONF = """
+from sphinx_markdown_parser.parser import {parser}
+
+extensions = ['sphinx_markdown_parser']
+master_doc = 'index'
+exclude_patterns = ['_build', '_parse_cache']
+
+def setup_markdown(app):
+    app.add_source_suffix('.md', 'markdown')
+    app.add_source_parser({parser})
+    app.add_config_value('markdown_parser_config', {config!r}, True)
+
+setup = setup_markdown
+{setup}"""
+
+
+def project_conf(config=None, parser='CommonMarkParser', setup=''):
+    """Return a conf.py reading markdown with ``parser`` and ``config``.
+
+    ``setup`` is appended to the file; it may replace ``setup``, calling
+    ``setup_markdown``.
+    """
+    return PROJECT_CONF.format(parser=parser, config=config or {},
+                               setup=setup)
+
+
+def doctree_signature(doctree):
+    # pickles of equal trees may differ in the strings they share
+    return [
+        (type(node), getattr(node, 'attributes', None), node.rawsource,
+         node.source, node.line, node.astext())
+        for node in doctree.traverse()
+    ]
+
+
+class ProjectTests(unittest.TestCase):
+    """Build a project written to a temporary source directory."""
+
+    def setUp(self):
+        self.srcdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.srcdir)
+
+    def path(self, *names):
+        return os.path.join(self.srcdir, *names)
+
+    def write(self, name, text):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with io.open(path, 'w') as f:
+            f.write(u'%s' % text)
+
+    def read(self, *names):
+        with io.open(self.path(*names)) as f:
+            return f.read()
+
+    def outdir(self, name='html'):
+        return self.path('_build', name)
+
+    def make_app(self, name='html', **kwargs):
+        """Return an html builder app writing to ``_build/<name>``."""
+        outdir = self.outdir(name)
+        kwargs.setdefault('status', None)
+        kwargs.setdefault('warning', None)
+        return Sphinx(
+            srcdir=self.srcdir,
+            confdir=self.srcdir,
+            outdir=outdir,
+            doctreedir=os.path.join(outdir, '.doctrees'),
+            buildername='html',
+            **kwargs
+        )
+
+    def build(self, name='html', force_all=False, **kwargs):
+        """Build the project into ``_build/<name>`` and return the app."""
+        app = self.make_app(name, **kwargs)
+        app.build(force_all=force_all)
+        return app
+
+    def doctree_files(self, name='html'):
+        """Return the pickled doctrees of the build ``name`` by file name."""
+        doctreedir = os.path.join(self.outdir(name), '.doctrees')
+        doctrees = {}
+        for filename in os.listdir(doctreedir):
+            if filename.endswith('.doctree'):
+                with open(os.path.join(doctreedir, filename), 'rb') as f:
+                    doctrees[filename] = f.read()
+        return doctrees
+
+    def doctree_signatures(self, name='html'):
+        return {
+            filename: doctree_signature(pickle.loads(data))
+            for filename, data in self.doctree_files(name).items()
+        }
+
+    def saved_env(self, name='html'):
+        """Return the environment saved by the build ``name``."""
+        path = os.path.join(self.outdir(name), '.doctrees',
+                            'environment.pickle')
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+PARALLEL_PAGE = """
+Page {0}
+=======
+
+Some *text* with `$ x^{0} $` and a [link](page{1}.md).
+
+```math
+y = x^{0}
+```
+
+```python
+print({0})
+```
+
+```eval_rst
+.. note:: Note {0}
+```
+"""
+
+
+class ParallelBuildTests(ProjectTests):
+
+    def setUp(self):
+        super(ParallelBuildTests, self).setUp()
+        self.write('conf.py', project_conf({'enable_auto_structify': True}))
+        pages = ['page%d' % i for i in range(40)]
+        self.write('index.md', 'Index\n=====\n\n' + ''.join(
+            '* [%s](%s.md)\n' % (p, p) for p in pages
+        ))
+        for i, page in enumerate(pages):
+            self.write(page + '.md',
+                       PARALLEL_PAGE.format(i, (i + 1) % len(pages)))
+
+    def test_doctrees_match_serial_build(self):
+        self.build('serial', True, parallel=0)
+        self.build('parallel', True, parallel=4)
+        serial = self.doctree_files('serial')
+        parallel = self.doctree_files('parallel')
+        self.assertEqual(len(serial), 41)
+        self.assertEqual(sorted(serial), sorted(parallel))
+        for name in serial:
+            self.assertEqual(serial[name], parallel[name], name)
+
+
+class DependencyTests(ProjectTests):
+
+    def setUp(self):
+        super(DependencyTests, self).setUp()
+        self.write('conf.py', project_conf())
+        self.write('index.md', 'Index\n=====\n')
+        self.write('a.md', 'A\n=\n\nSee [b](b.md).\n')
+        self.write('b.md', 'B\n=\n')
+        self.write('c.md', 'C\n=\n')
+
+    def write(self, name, text):
+        super(DependencyTests, self).write(name, text)
+        # make sure sphinx sees the file as modified after the last build
+        mtime = time.time() + 10
+        os.utime(self.path(name), (mtime, mtime))
+
+    def build(self):
+        read = []
+        app = self.make_app()
+        app.connect(
+            'env-before-read-docs',
+            lambda app, env, docnames: read.extend(docnames)
+        )
+        app.build()
+        return sorted(read)
+
+    def test_rebuild_count(self):
+        self.assertEqual(self.build(), ['a', 'b', 'c', 'index'])
+        self.write('b.md', 'B\n=\n\nChanged.\n')
+        self.assertEqual(self.build(), ['a', 'b'])
+        # b was re-read, move its future mtime back before changing c
+        past = time.time() - 10
+        os.utime(self.path('b.md'), (past, past))
+        self.write('c.md', 'C\n=\n\nChanged.\n')
+        self.assertEqual(self.build(), ['c'])
+
+    def test_touched_sources(self):
+        self.assertEqual(self.build(), ['a', 'b', 'c', 'index'])
+        # a checkout touches every file without changing them
+        for name in ('index.md', 'a.md', 'b.md', 'c.md'):
+            self.write(name, self.read(name))
+        self.assertEqual(self.build(), [])
+        self.assertEqual(self.build(), [])
+        self.write('b.md', 'B\n=\n\nChanged.\n')
+        self.assertEqual(self.build(), ['a', 'b'])
+
+
+class TimingReportTests(ProjectTests):
+
+    def setUp(self):
+        super(TimingReportTests, self).setUp()
+        self.write('conf.py', project_conf({
+            'collect_timings': True,
+            'enable_auto_structify': True,
+        }))
+        self.docnames = ['index'] + ['page%d' % i for i in range(8)]
+        for docname in self.docnames:
+            self.write(docname + '.md', PARALLEL_PAGE.format(docname, 'index'))
+
+    def test_report(self):
+        for parallel in (0, 2):
+            name = 'html%d' % parallel
+            self.build(name, True, parallel=parallel)
+            report = json.loads(self.read('_build', name,
+                                          'markdown_timings.json'))
+            text = self.read('_build', name, 'markdown_timings.txt')
+            documents = report['documents']
+            self.assertEqual(
+                sorted(d['docname'] for d in documents), self.docnames
+            )
+            totals = [d['total'] for d in documents]
+            self.assertEqual(totals, sorted(totals, reverse=True))
+            self.assertEqual(
+                sorted(report['phases']),
+                ['autostructify', 'block parse', 'doctree walk']
+            )
+            self.assertIn('Slowest documents:', text)
+            self.assertFalse(hasattr(self.saved_env(name),
+                                     'markdown_timings'))
+
+
+class WarmUpTests(ProjectTests):
+
+    def setUp(self):
+        super(WarmUpTests, self).setUp()
+        self.docnames = ['index'] + ['page%d' % i for i in range(6)]
+        for i, docname in enumerate(self.docnames):
+            # pages of different sizes, linking to the next page
+            self.write(docname + '.md', ''.join(
+                PARALLEL_PAGE.format('%d.%d' % (i, j), i + 1)
+                for j in range(i + 1)
+            ))
+
+    def build(self, name):
+        app = super(WarmUpTests, self).build(name, True)
+        signatures = self.doctree_signatures(name)
+        return app, {
+            docname: signatures[docname + '.doctree']
+            for docname in self.docnames
+        }
+
+    def check_warm_up(self, parser):
+        from sphinx_markdown_parser.warmup import main
+        self.write('conf.py', project_conf({
+            'enable_auto_structify': True,
+            'parse_cache_dir': '_parse_cache',
+        }, parser))
+        app, cold = self.build('cold')
+        self.assertEqual(app._markdown_parse_cache.hits, 0)
+        self.assertEqual(main([self.srcdir, '-q', '-j', '2']), 0)
+        app, warm = self.build('warm')
+        self.assertEqual(
+            app._markdown_parse_cache.hits, len(self.docnames)
+        )
+        self.assertEqual(cold, warm)
+        self.assertIn(self.path('page1.md'), app.env.dependencies['index'])
+
+    def test_commonmark_parser(self):
+        self.check_warm_up('CommonMarkParser')
+
+    def test_markdown_parser(self):
+        self.check_warm_up('MarkdownParser')
+
+    def test_key_depends_on_library_versions(self):
+        from sphinx_markdown_parser import parse_cache
+        from sphinx_markdown_parser.markdown_parser import MarkdownParser
+        cache = parse_cache.ParseCache(self.srcdir)
+        args = (MarkdownParser(), 'index.md', '# Index', None)
+        key = cache.key(*args)
+        self.assertIn('Markdown ', parse_cache.library_versions())
+        with mock.patch.object(parse_cache, 'library_versions',
+                               lambda: 'docutils 0.1'):
+            self.assertNotEqual(cache.key(*args), key)
+
+
+SLIM_PAGE = """
+Slim
+====
+
+Text with `inline code`, <b>raw html</b> and a [link](other.md).
+
+<div>raw block</div>
+
+```python
+print(1)
+```
+"""
+
+
+class SlimDoctreeTests(ProjectTests):
+
+    def setUp(self):
+        super(SlimDoctreeTests, self).setUp()
+        self.write('index.md', SLIM_PAGE)
+
+    def build(self, parser, slim):
+        self.write('conf.py', project_conf({
+            'enable_auto_structify': True,
+            'parse_cache_dir': '_parse_cache',
+        }, parser))
+        name = parser + str(slim)
+        super(SlimDoctreeTests, self).build(name, confoverrides={
+            'markdown_parser_config': {'slim_doctree': slim},
+        })
+        html = self.read('_build', name, 'index.html')
+        doctree = pickle.loads(self.doctree_files(name)['index.doctree'])
+        return html, doctree
+
+    def check_slim(self, parser):
+        html, doctree = self.build(parser, False)
+        slim_html, slim_doctree = self.build(parser, True)
+        self.assertEqual(html, slim_html)
+        for node in slim_doctree.traverse():
+            if isinstance(node, (nodes.raw, nodes.literal, nodes.Text)):
+                self.assertEqual(node.rawsource, '')
+        # the html writer highlights literal blocks whose rawsource matches
+        for node in slim_doctree.traverse(nodes.literal_block):
+            self.assertEqual(node.rawsource, node.astext())
+        return slim_html
+
+    def test_commonmark_parser(self):
+        html = self.check_slim('CommonMarkParser')
+        self.assertIn('highlight-python', html)
+
+    def test_markdown_parser(self):
+        self.check_slim('MarkdownParser')
+
+
+SPLIT_CONFIG = {
+    'enable_auto_structify': True,
+    'split_threshold': 100,
+}
+
+SPLIT_PAGE = """# Big
+
+Intro, jump to [B](#section-b).
+
+## Section A
+
+See [section B](#section-b) and [A](#section-a).
+
+```
+## not a heading
+```
+
+## Section B
+
+Back to [the intro](#big).
+"""
+
+
+class SplitTests(ProjectTests):
+
+    def setUp(self):
+        super(SplitTests, self).setUp()
+        self.write('conf.py', project_conf(SPLIT_CONFIG))
+        self.write('index.md', 'Index\n=====\n\n* [Big](big.md)\n')
+        self.write('big.md', SPLIT_PAGE)
+
+    def test_split(self):
+        parts = ['_split/big/1-section-a', '_split/big/2-section-b']
+        app = self.build()
+        self.assertEqual(app.env.toctree_includes['big'], parts)
+        self.assertTrue(set(parts) <= app.env.found_docs)
+        body = self.read('_build', 'html', 'big.html').split(
+            '<div class="body"')[1]
+        self.assertNotIn('Section A', body.split('toctree-wrapper')[0])
+        part = self.read('_split', 'big', '1-section-a.md')
+        self.assertIn('[section B](2-section-b.md#section-b)', part)
+        self.assertIn('[A](#section-a)', part)
+        self.assertIn('## not a heading', part)
+        self.assertIn('[the intro](../../big.md#big)',
+                      self.read('_split', 'big', '2-section-b.md'))
+        self.assertIn('href="_split/big/2-section-b.html#section-b"',
+                      self.read('_build', 'html', 'big.html'))
+
+        # unchanged parts are left alone
+        path = os.path.join(self.srcdir, '_split', 'big', '1-section-a.md')
+        past = time.time() - 10
+        os.utime(path, (past, past))
+        self.write('big.md', SPLIT_PAGE.replace('Back to', 'Return to'))
+        self.build()
+        self.assertEqual(os.path.getmtime(path), past)
+        self.assertIn('Return to', self.read('_split', 'big',
+                                             '2-section-b.md'))
+
+        # removed parts are deleted
+        self.write('big.md', SPLIT_PAGE.split('## Section B')[0] + 'x' * 100)
+        app = self.build()
+        self.assertEqual(os.listdir(os.path.dirname(path)),
+                         ['1-section-a.md'])
+        self.assertEqual(app.env.toctree_includes['big'], parts[:1])
+
+    def test_links_from_other_documents(self):
+        self.write('index.md', 'Index\n=====\n\n* [Big](big.md)\n\n'
+                   'See [B](big.md#section-b), [A](/big.md#section-a) '
+                   'and [the intro](big.md#big).\n')
+        os.makedirs(os.path.join(self.srcdir, 'sub'))
+        self.write('sub/page.md', '# Page\n\n[B](../big.md#section-b)\n')
+        self.build()
+        index = self.read('_build', 'html', 'index.html')
+        self.assertIn('href="_split/big/2-section-b.html#section-b"', index)
+        self.assertIn('href="/_split/big/1-section-a.html#section-a"', index)
+        self.assertIn('href="big.html#big"', index)
+        self.assertIn('href="../_split/big/2-section-b.html#section-b"',
+                      self.read('_build', 'html', 'sub', 'page.html'))
+
+    def test_split_dir_with_sources(self):
+        self.write('conf.py', project_conf(dict(SPLIT_CONFIG,
+                                                split_dir='docs')))
+        os.makedirs(os.path.join(self.srcdir, 'docs', 'big'))
+        self.write('docs/guide.md', '# Guide\n\nA real source.\n')
+        self.write('docs/big/notes.md', '# Notes\n\nAnother one.\n')
+        app = self.build()
+        self.assertEqual(app.env.toctree_includes['big'],
+                         ['docs/big/1-section-a', 'docs/big/2-section-b'])
+        self.assertTrue({'docs/guide', 'docs/big/notes'} <= app.env.found_docs)
+
+        # parts are removed when the document shrinks, the sources stay
+        self.write('big.md', 'x' * 10)
+        app = self.build()
+        self.assertNotIn('big', app.env.toctree_includes)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.srcdir, 'docs'))),
+                         ['big', 'guide.md'])
+        self.assertEqual(os.listdir(os.path.join(self.srcdir, 'docs', 'big')),
+                         ['notes.md'])
+
+    def test_split_does_not_overwrite_sources(self):
+        os.makedirs(os.path.join(self.srcdir, '_split', 'big'))
+        self.write('_split/big/1-section-a.md', '# Mine\n')
+        app = self.build()
+        self.assertNotIn('big', app.env.toctree_includes)
+        self.assertEqual(self.read('_split', 'big', '1-section-a.md'),
+                         '# Mine\n')
+        self.assertFalse(os.path.exists(
+            os.path.join(self.srcdir, '_split', 'big', '2-section-b.md')
+        ))
+
+    def test_split_turned_off(self):
+        os.makedirs(os.path.join(self.srcdir, '_split'))
+        self.write('_split/notes.md', '# Notes\n')
+        self.build()
+        self.write('conf.py', project_conf(dict(SPLIT_CONFIG,
+                                                split_threshold=0)))
+        app = self.build()
+        self.assertNotIn('big', app.env.toctree_includes)
+        self.assertEqual(os.listdir(os.path.join(self.srcdir, '_split')),
+                         ['notes.md'])
+
+    def test_parts_not_written(self):
+        def write_part(path, text, encoding):
+            if path.endswith('2-section-b.md'):
+                raise PermissionError('read-only')
+            write(path, text, encoding)
+
+        write = split.write_if_changed
+        warning = io.StringIO()
+        with mock.patch.object(split, 'write_if_changed', write_part):
+            app = self.build(warning=warning)
+        self.assertIn('not splitting big: read-only', warning.getvalue())
+        self.assertNotIn('big', app.env.toctree_includes)
+        self.assertIn('Section B', self.read('_build', 'html', 'big.html'))
+        self.assertFalse(os.path.exists(os.path.join(self.srcdir, '_split')))
+
+
+
+
+INCLUDE_PAGE = """Page {0}
+=======
+
+```eval_rst
+.. include:: snippet.txt
+
+.. include:: part.rst
+```
+"""
+
+
+class EvalRstCacheTests(ProjectTests):
+
+    def setUp(self):
+        super(EvalRstCacheTests, self).setUp()
+        self.write('conf.py', project_conf({'enable_auto_structify': True}))
+        self.write('index.md', 'Index\n=====\n\n* [a](a/page.md)\n'
+                   '* [b](b/page.md)\n')
+        for directory in ('a', 'b'):
+            self.write(directory + '/page.md', INCLUDE_PAGE.format(directory))
+            self.write(directory + '/snippet.txt',
+                       'SNIPPET FROM %s\n' % directory)
+            self.write(directory + '/part.rst', 'PART FROM %s\n' % directory)
+
+    def check_includes(self):
+        for directory in ('a', 'b'):
+            self.assertIn('SNIPPET FROM %s' % directory,
+                          self.read('_build', 'html', directory, 'page.html'))
+
+    def test_relative_include(self):
+        self.build()
+        self.check_includes()
+
+    def test_replayed_dependencies(self):
+        # b/other reuses the fragment parsed for b/page, or the reverse
+        self.write('b/other.md', INCLUDE_PAGE.format('other'))
+        app = self.build()
+        self.assertEqual(app._markdown_caches['eval_rst'].hits, 1)
+        for directory in ('a', 'b'):
+            docname = directory + '/page'
+            self.assertIn(directory + '/part', app.env.included[docname])
+            self.assertEqual(
+                {os.path.basename(os.path.dirname(path))
+                 for path in app.env.dependencies[docname]}, {directory}
+            )
+        self.assertEqual(app.env.included['b/other'],
+                         app.env.included['b/page'])
+        self.assertEqual(app.env.dependencies['b/other'],
+                         app.env.dependencies['b/page'])
+        # editing the snippet of b rebuilds the documents of b
+        self.write('b/snippet.txt', 'CHANGED IN b\n')
+        future = time.time() + 10
+        os.utime(self.path('b', 'snippet.txt'), (future, future))
+        self.build()
+        self.assertIn('CHANGED IN b',
+                      self.read('_build', 'html', 'b', 'other.html'))
+        self.assertIn('SNIPPET FROM a',
+                      self.read('_build', 'html', 'a', 'page.html'))
+
+
+SHARED_CACHE_PAGE = PARALLEL_PAGE + """
+```eval_rst
+.. list-table:: Shared
+   :header-rows: 1
+
+   * - Name
+     - Value
+   * - *a*
+     - ``1``
+```
+"""
+
+
+class SharedCacheTests(ProjectTests):
+
+    def setUp(self):
+        super(SharedCacheTests, self).setUp()
+        pages = ['page%d' % i for i in range(16)]
+        self.write('index.md', 'Index\n=====\n\n' + ''.join(
+            '* [%s](%s.md)\n' % (p, p) for p in pages
+        ))
+        for i, page in enumerate(pages):
+            self.write(page + '.md',
+                       SHARED_CACHE_PAGE.format(i, (i + 1) % len(pages)))
+
+    def build(self, name, shared_cache):
+        self.write('conf.py', project_conf({
+            'enable_auto_structify': True,
+            'shared_cache': shared_cache,
+        }))
+        app = super(SharedCacheTests, self).build(
+            name, True, parallel=4
+        )
+        return app, self.doctree_signatures(name)
+
+    def test_shared_fragments(self):
+        _, expected = self.build('plain', False)
+        app, doctrees = self.build('shared', True)
+        stats = app._markdown_shared_cache_stats
+        self.assertGreater(stats['hits'], 0)
+        self.assertGreater(stats['entries'], 0)
+        self.assertIsNone(app._markdown_shared_cache)
+        self.assertEqual(sorted(expected), sorted(doctrees))
+        for name in expected:
+            self.assertEqual(expected[name], doctrees[name], name)
+
+    def test_relative_include(self):
+        # the workers share fragments under a key holding the directory
+        for directory in ('a', 'b'):
+            self.write(directory + '/snippet.txt',
+                       'SNIPPET FROM %s\n' % directory)
+            self.write(directory + '/part.rst', 'PART FROM %s\n' % directory)
+            for i in range(8):
+                self.write('%s/page%d.md' % (directory, i),
+                           INCLUDE_PAGE.format(i))
+        app, _ = self.build('shared', True)
+        self.assertGreater(app._markdown_shared_cache_stats['hits'], 0)
+        for directory in ('a', 'b'):
+            for i in range(8):
+                docname = '%s/page%d' % (directory, i)
+                self.assertIn('SNIPPET FROM %s' % directory,
+                              self.read('_build', 'shared', docname + '.html'))
+                self.assertIn(directory + '/part', app.env.included[docname])
+
+
+TRACE_SETUP = """
+def record(app, docname, info):
+    app.markdown_events.append((docname, info))
+
+def setup(app):
+    setup_markdown(app)
+    app.markdown_events = []
+    app.connect('markdown-parse-start', record)
+    app.connect('markdown-parse-end', record)
+    app.connect('markdown-transform-end', record)
+"""
+
+
+class TraceTests(ProjectTests):
+
+    def setUp(self):
+        super(TraceTests, self).setUp()
+        self.docnames = ['index'] + ['page%d' % i for i in range(8)]
+        for docname in self.docnames:
+            self.write(docname + '.md', PARALLEL_PAGE.format(docname, 'index'))
+
+    def build(self, trace_file, parallel):
+        self.write('conf.py', project_conf({
+            'enable_auto_structify': True,
+            'trace_file': trace_file,
+        }, setup=TRACE_SETUP))
+        name = 'html%d' % parallel
+        app = super(TraceTests, self).build(name, True, parallel=parallel)
+        return app, os.path.join(self.outdir(name), trace_file or '')
+
+    def test_events(self):
+        app, _ = self.build(None, 0)
+        events = app.markdown_events
+        self.assertEqual(len(events), 3 * len(self.docnames))
+        start, end, transform = events[:3]
+        self.assertEqual(start[1], {
+            'stage': 'parse',
+            'component': 'CommonMarkParser',
+            'size': len(PARALLEL_PAGE.format('index', 'index')),
+        })
+        self.assertEqual(end[0], start[0])
+        self.assertEqual(
+            sorted(end[1]['phases']), ['block parse', 'doctree walk']
+        )
+        self.assertGreater(end[1]['nodes'], 10)
+        self.assertGreaterEqual(end[1]['duration'], 0)
+        self.assertEqual(transform[1]['stage'], 'transform')
+        self.assertEqual(transform[1]['component'], 'AutoStructify')
+        self.assertEqual(list(transform[1]['phases']), ['autostructify'])
+
+    def test_chrome_trace(self):
+        _, path = self.build('trace/markdown.json', 2)
+        with io.open(path) as f:
+            trace = json.load(f)
+        events = trace['traceEvents']
+        self.assertEqual(len(events), 2 * len(self.docnames))
+        self.assertEqual({e['ph'] for e in events}, {'X'})
+        self.assertEqual(min(e['ts'] for e in events), 0)
+        self.assertEqual(
+            sorted(e['args']['docname'] for e in events
+                   if e['cat'] == 'markdown,parse'), self.docnames
+        )
+        self.assertFalse(hasattr(self.saved_env('html2'), 'markdown_spans'))
+
+    def test_json_lines(self):
+        _, path = self.build('markdown.jsonl', 0)
+        with io.open(path) as f:
+            spans = [json.loads(line) for line in f]
+        self.assertEqual(len(spans), 2 * len(self.docnames))
+        starts = [span['start'] for span in spans]
+        self.assertEqual(starts, sorted(starts))
+        self.assertEqual(
+            {span['stage'] for span in spans}, {'parse', 'transform'}
+        )
+
+
+class ParserConfigTests(ProjectTests):
+
+    def setUp(self):
+        super(ParserConfigTests, self).setUp()
+        self.write('conf.py', "def setup(app):\n"
+                   "    app.add_config_value('markdown_parser_config', "
+                   "{'enable_math': False}, True)\n")
+        self.write('index.rst', 'Index\n=====\n')
+
+    def test_constructor_config(self):
+        from docutils.frontend import OptionParser
+        from docutils.utils import new_document
+        from sphinx_markdown_parser.markdown_parser import MarkdownParser
+        app = self.make_app()
+        parser = MarkdownParser({'extensions': ['toc'], 'enable_math': True})
+        settings = OptionParser(components=(parser,)).get_default_values()
+        settings.env = app.env
+        document = new_document('index.md', settings)
+        config = parser.get_config(document)
+        self.assertEqual(config['extensions'], ('toc',))
+        self.assertFalse(config['enable_math'])
+        self.assertIs(MarkdownParser({'extensions': ['toc'],
+                                      'enable_math': True}).get_config(
+            document
+        ), config)
+        self.assertEqual(MarkdownParser().get_config(document)['extensions'],
+                         ())
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import gc
+import unittest
+import weakref
+
+from docutils import nodes
+from docutils.frontend import OptionParser
+from docutils.parsers.rst import Parser
+from docutils.utils import new_document
+
+from sphinx_markdown_parser.states import DummyStateMachine, new_inliner
+
+
+def make_document():
+    settings = OptionParser(components=(Parser,)).get_default_values()
+    return new_document('<string>', settings)
+
+
+class TestDummyStateMachine(unittest.TestCase):
+
+    def test_run_role_after_bind(self):
+        document = make_document()
+        paragraph = nodes.paragraph()
+        document += paragraph
+        state_machine = DummyStateMachine()
+        state_machine.bind_document(document)
+        state_machine.set_parent(paragraph, 0)
+        node = state_machine.run_role('math', content='`x^2`')
+        self.assertIsInstance(node, nodes.math)
+        self.assertEqual(node.astext(), 'x^2')
+        self.assertIs(state_machine.memo.inliner.parent, paragraph)
+
+    def test_reset_rebinds_document(self):
+        state_machine = DummyStateMachine()
+        first, second = make_document(), make_document()
+        state_machine.reset(first, first, 0)
+        inliner = state_machine.memo.inliner
+        state_machine.reset(second, second, 1)
+        self.assertIs(state_machine.document, second)
+        self.assertIs(state_machine.memo.inliner, inliner)
+        self.assertIs(inliner.document, second)
+        self.assertEqual(state_machine.memo.section_level, 1)
+
+    def test_inliner_customizations_are_shared(self):
+        settings = make_document().settings
+        first, second = new_inliner(settings), new_inliner(settings)
+        self.assertIs(first.patterns, second.patterns)
+        for _, method in second.implicit_dispatch:
+            self.assertIs(method.__self__, second)
+
+    def test_inliner_customizations_keep_no_inliner(self):
+        settings = make_document().settings
+        settings.character_level_inline_markup = True
+        settings.pep_references = settings.rfc_references = True
+        first = weakref.ref(new_inliner(settings))
+        gc.collect()
+        self.assertIsNone(first())
+        second = new_inliner(settings)
+        self.assertEqual(len(second.implicit_dispatch), 3)
+        for _, method in second.implicit_dispatch:
+            self.assertIs(method.__self__, second)
+
+
+if __name__ == '__main__':
+    unittest.main()